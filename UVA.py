@@ -6,6 +6,7 @@ from cornellbaseball import ncaa_scrape
 from cornellbaseball import boydsworld_scraper as bd
 from cornellbaseball import batting_metrics
 from cornellbaseball import win_pct
+from cornellbaseball import pitch_counts
 import plotly.express as px
 import plotly.graph_objects as go
 import altair as alt
@@ -13,7 +14,7 @@ import time
 
 st.set_page_config(page_title="Scouting Report: UVA", layout="wide")
 
-player = st.sidebar.selectbox('Player', options=['Nate Savino'])
+player = st.sidebar.selectbox('Player', options=pitch_counts.pitchers() or ['Nate Savino'])
 st.header(player)
 st.caption("LHP / Jr / 6'3\" / 210lbs")
 
@@ -53,88 +54,19 @@ putaway %
 
 ### PITCH TREE ###
 with st.expander("Plinko"):
-    ### LEVEL 1 ####
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2020 = [126, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2020, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='0-0', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    st.plotly_chart(fig, use_container_width=True)
-
-
-    ### LEVEL 2 ####
-    zero_one, one_zero = st.columns(2)
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2020 = [126, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2020, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='0-1', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    zero_one.plotly_chart(fig, use_container_width=True)
-
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2021 = [16, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2021, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='1-0', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    one_zero.plotly_chart(fig, use_container_width=True)
-
-    ### LEVEL 3 ####
-    zero_two, one_one, two_zero = st.columns(3)
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2020 = [126, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2020, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='0-2', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    zero_two.plotly_chart(fig, use_container_width=True)
-
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2021 = [16, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2021, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='1-1', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    one_one.plotly_chart(fig, use_container_width=True)
-
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2021 = [16, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2021, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='2-0', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    two_zero.plotly_chart(fig, use_container_width=True)
-
-    ### LEVEL 4 ####
-    zero_two, one_one, two_zero = st.columns(3)
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2020 = [126, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2020, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='1-2', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    zero_two.plotly_chart(fig, use_container_width=True)
-
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2021 = [16, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2021, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='2-1', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    one_one.plotly_chart(fig, use_container_width=True)
-
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2021 = [16, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2021, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='3-0', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    two_zero.plotly_chart(fig, use_container_width=True)
-
-    ### LEVEL 5 ####
-    zero_two, one_one = st.columns(2)
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2020 = [126, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2020, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='2-2', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    zero_two.plotly_chart(fig, use_container_width=True)
-
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2021 = [16, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2021, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='3-1', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    one_one.plotly_chart(fig, use_container_width=True)
-
-    ### LEVEL 6 ####
-    labels = ['Fastball','Slider','Changeup','Curveball','Unknown']
-    values_2020 = [126, 46, 8, 4, 3]
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values_2020, hole=.5)])
-    fig.update_layout(showlegend=False, annotations=[dict(text='3-2', x=0.5, y=0.5, font_size=20, showarrow=False)])
-    st.plotly_chart(fig, use_container_width=True)
+    pitch_season = st.selectbox('Season', options=['All'] + pitch_counts.seasons(player), key='plinko_season')
+    batter_side = st.radio('Batters', options=[pitch_counts.ALL_BATTERS, 'Left', 'Right'], horizontal=True)
+    mix = pitch_counts.get_pitch_mix(player, season=None if pitch_season == 'All' else pitch_season, batter_side=batter_side)
+    if mix.to_numpy().sum() == 0:
+        st.info('no pitch-by-pitch data for '+player)
+    else:
+        # one row of the tree per number of pitches thrown, 0-0 through 3-2
+        for level in pitch_counts.COUNT_LEVELS:
+            columns = st.columns(len(level)) if len(level) > 1 else [st]
+            for column, count in zip(columns, level):
+                fig = go.Figure(data=[go.Pie(labels=pitch_counts.PITCH_TYPES, values=mix.loc[count].tolist(), hole=.5)])
+                fig.update_layout(showlegend=False, annotations=[dict(text=count, x=0.5, y=0.5, font_size=20, showarrow=False)])
+                column.plotly_chart(fig, use_container_width=True)
 
 st.subheader("Plate Discipline")
 discipline = pd.DataFrame({'F-Strike%':[0, 0],
@@ -8,28 +8,34 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from st_aggrid import AgGrid
-from cornellbaseball import ncaa_scrape
-from cornellbaseball import batting_metrics
+from cornellbaseball import player_search
+from cornellbaseball import player_store
 import plotly.express as px
+import app_cache
 
-@st.cache
+@app_cache.resource
 def load_data():
     df = pd.read_pickle('data/ncaa/players_clean.df')
     df = df.astype({'stats_player_seq':'string'})
     return df
 
-def load_player_lu_table():
+@app_cache.resource
+def load_player_index():
     lu = pd.read_pickle('data/ncaa/players_lookup.df').reset_index()
     lu = lu.astype({'stats_player_seq':'string'})
-    res = lu.to_dict('records')
-    return res 
+    return player_search.PlayerIndex(lu)
 
 
 #### PLAYER STATS ######
-records = load_player_lu_table()
+index = load_player_index()
 
-# user input: select player
-choice = st.selectbox('Select a player', options=records, format_func=lambda record: f'''{record['name'][0]}, {record['position']}, {record['school']}, {record['year']}''')
+# user input: search for a player, then select one of the top matches
+query = st.text_input('Search for a player', placeholder='name, school, position or year')
+matches = index.search(query, limit=player_search.SEARCH_LIMIT)
+if len(matches) == 0:
+    st.info('Type a name, school, position or year to find a player')
+    st.stop()
+choice = st.selectbox('Select a player', options=matches.to_dict('records'), format_func=lambda record: f'''{record['name']}, {record['position']}, {record['school']}, {record['year']}''')
 
 player_stats_container = st.container()
 # regular stats
@@ -37,24 +43,19 @@ players = load_data()
 player = players.loc[players['stats_player_seq'] == choice['stats_player_seq']]
 player_row = player.iloc[0]
 
-# load data from NCAA 
-basic_stats = ncaa_scrape.get_career_stats(stats_player_seq = player_row['stats_player_seq'], team_id = player_row['school_id'], season_id = player_row['season_id'])
-
-# transform NCAA data 
-basic_stats['season_id'] = player_row['season_id']
-basic_stats['school_id'] = player_row['school_id']
-basic_stats['stats_player_seq'] = player_row['stats_player_seq']
-basic_stats['name'] = player_row['name']
-basic_stats.stats_player_seq.astype('string')
-                                                            
- # join on player-seasons table                                    
-df = pd.merge(basic_stats, players, left_on=['stats_player_seq', 'season_id'], right_on=['stats_player_seq', 'season_id'], copy=True)
-df.drop(columns=['name_y', 'school_id_y', 'school_id_x', 'season_y', 'batting_id', 'pitching_id', 'conference_id', 'season_id', 'year', 'stats_player_seq', 'team_id'], inplace=True)
-# TODO create details table to merge onto
-df.rename(columns={'name_x':'name', 'season_x':'season'}, inplace=True)
-                                                            
-# add advanced stats 
-advanced_stats = batting_metrics.add_columns(df).loc[:, ['season', 'wOBA', 'wRAA', 'wRC']]
+# precomputed career stats and advanced metrics, players not stored yet are scraped from NCAA in the background.
+# The store is built from the conference pickles in the background the first time the app runs
+player_store.request_build()
+career = player_store.get_or_refresh(stats_player_seq = player_row['stats_player_seq'], school_id = player_row['school_id'], season_id = player_row['season_id'], name = player_row['name'])
+if len(career) == 0:
+    player_stats_container.info('Loading stats for this player from NCAA, refresh the page in a moment')
+    st.stop()
+# join the roster details of each season (position, class, ...) from the player-seasons table
+details = player.loc[:, ['season'] + [col for col in player.columns if col not in career.columns]]
+details = details.astype({'season':'int64'}).drop_duplicates(subset=['season'])
+career = career.merge(details, how='left', on='season')
+df = career.drop(columns=['school_id', 'season_id', 'batting_id', 'pitching_id', 'conference_id', 'year', 'stats_player_seq', 'team_id', 'refreshed_at', 'wOBA', 'wRAA', 'wRC'], errors='ignore')
+advanced_stats = career.loc[:, ['season', 'wOBA', 'wRAA', 'wRC']]
 
 # write basic stats 
 player_stats_container.subheader('Season Totals')
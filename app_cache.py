@@ -0,0 +1,34 @@
+"""
+Shared caching policy for the Streamlit apps (app.py, scouting.py)
+
+Tables read from disk never change while the server runs, so they are held once per process and shared by
+every session (resource cache), without being hashed or copied on access. Do not modify them in place.
+Results derived from user input are cached by their arguments (data cache) and evicted after DATA_TTL seconds,
+or once DATA_MAX_ENTRIES results are held, so memory stays bounded as users sweep teams and seasons.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import streamlit as st
+
+# GLOBALS
+# seconds a derived result is kept
+DATA_TTL = 60 * 60
+# number of derived results kept per function
+DATA_MAX_ENTRIES = 32
+
+
+def resource(func):
+    """
+    Returns: func, cached once per process and shared by every session. For immutable tables and indexes
+    """
+    return st.cache_resource(func)
+
+def data(func=None, ttl=DATA_TTL, max_entries=DATA_MAX_ENTRIES):
+    """
+    Returns: func, cached by its arguments with ttl and max_entries eviction. For results derived from user input.
+    Can be used as @data or @data(ttl=..., max_entries=...)
+    """
+    decorator = st.cache_data(ttl=ttl, max_entries=max_entries)
+    if func is None:
+        return decorator
+    return decorator(func)
@@ -6,11 +6,15 @@ created by Nathan Blumenfeld for Cornell Baseball
 import pandas as pd
 import numpy as np
 from cornellbaseball import ncaa_scrape
+from cornellbaseball import linear_weights
 
 
 # filepath of D1 linear weights
 LW_FILEPATH = 'data/guts/ncaa_d1_woba_linear_weights.csv' # <-- Robert Fray's Linear Weights
 
+# filepath of park factors, by school
+PF_FILEPATH = 'data/guts/park_factors.csv'
+
 # number of decimal places to round floats to 
 ROUND_TO = 3
 
@@ -94,7 +98,20 @@ def calculate_wrc(player_row, weights_df, round_to = ROUND_TO):
         wrc = 0.00
     return round(wrc, round_to)
 
-def add_columns(df, lw_filepath = LW_FILEPATH):
+def season_weights(df, weights_df):
+    """
+    Returns: DataFrame of the linear weights row for each row of df, aligned with df's index
+
+    Weights are looked up once per distinct season rather than filtered per player. Rows whose
+    season has no linear weights get NaN.
+    """
+    seasons = pd.to_numeric(df['season'], errors='coerce')
+    weights = weights_df.drop_duplicates(subset='Season').set_index('Season')
+    res = weights.reindex(seasons.values)
+    res.index = df.index
+    return res
+
+def add_columns(df, lw_filepath = LW_FILEPATH, round_to = ROUND_TO, by_context = False):
     """
     Adds the following columns to a given DataFrame:
     
@@ -103,11 +120,119 @@ def add_columns(df, lw_filepath = LW_FILEPATH):
     wOBA
     wRAA
     wRC
+
+    Every column is computed for all rows at once, with the same formulas and rounding as
+    calculate_pa, calculate_singles, calculate_woba, calculate_wraa and calculate_wrc.
+    Players with 0 PA, or from a season without linear weights, get 0.00 for wOBA, wRAA and wRC
+
+    Parameter by_context: if True, score each row against the weights of its own (season, division, conference)
+    registered with linear_weights, instead of D1 weights by season from lw_filepath
+    Precondition: by_context is a bool
+    """
+    return _add_columns(df, _weights(df, lw_filepath, by_context), round_to)
+
+def _weights(df, lw_filepath, by_context):
+    """
+    Returns: linear weights aligned with df, by context (see linear_weights.join_weights) or by season
+    """
+    if by_context:
+        return linear_weights.join_weights(df)
+    return season_weights(df, pd.read_csv(lw_filepath))
+
+def _add_columns(df, lw, round_to):
+    """
+    add_columns, given the linear weights already aligned with df by season_weights
+    """
+    pa = (df['AB'] + df['BB'] + df['SF'] + df['SH'] + df['HBP'] - df['IBB']).to_numpy(dtype='float64')
+    singles = (df['H'] - df['2B'] - df['3B'] - df['HR']).to_numpy(dtype='float64')
+    valid = (pa != 0) & lw['wOBA'].notna().to_numpy()
+    safe_pa = np.where(valid, pa, 1.0)
+    woba = ((lw['wBB'].to_numpy() * df['BB'].to_numpy(dtype='float64')
+            + lw['wHBP'].to_numpy() * df['HBP'].to_numpy(dtype='float64')
+            + lw['w1B'].to_numpy() * singles
+            + lw['w2B'].to_numpy() * df['2B'].to_numpy(dtype='float64')
+            + lw['w3B'].to_numpy() * df['3B'].to_numpy(dtype='float64')
+            + lw['wHR'].to_numpy() * df['HR'].to_numpy(dtype='float64')) / safe_pa)
+    woba = np.round(np.where(valid, woba, 0.00), round_to)
+    # wRAA and wRC are built from the rounded wOBA, as in calculate_wraa and calculate_wrc
+    runs_above_average = (woba - lw['wOBA'].to_numpy()) / lw['wOBAScale'].to_numpy()
+    wraa = np.where(valid, runs_above_average * pa, 0.00)
+    wrc = np.where(valid, (runs_above_average + lw['R/PA'].to_numpy()) * pa, 0.00)
+    df.loc[:, 'PA'] = pa
+    df.loc[:, '1B'] = singles
+    df.loc[:, 'wOBA'] = woba
+    df.loc[:, 'wRAA'] = np.round(wraa, round_to)
+    df.loc[:, 'wRC'] = np.round(wrc, round_to)
+    return df
+
+def _ratio(numerator, denominator):
+    """
+    Returns: numerator / denominator element-wise, 0.00 where the denominator is 0 or missing
+    """
+    numerator = np.asarray(numerator, dtype='float64')
+    denominator = np.asarray(denominator, dtype='float64')
+    valid = (denominator != 0) & ~np.isnan(denominator)
+    return np.where(valid, numerator / np.where(valid, denominator, 1.0), 0.00)
+
+def park_factors(df, pf_filepath = PF_FILEPATH, school_col = 'school'):
+    """
+    Returns: numpy array of the run park factor of each row's school, 1.0 where unknown
+    """
+    if school_col not in df.columns:
+        return np.ones(len(df))
+    pf = pd.read_csv(pf_filepath).drop_duplicates(subset='ballpark').set_index('ballpark')['park_factor_runs']
+    return df[school_col].map(pf).fillna(1.0).to_numpy(dtype='float64')
+
+def add_extended_columns(df, lw_filepath = LW_FILEPATH, pf_filepath = PF_FILEPATH, school_col = 'school', round_to = ROUND_TO, by_context = False):
+    """
+    Adds the full batting suite to a given DataFrame of player-seasons, in one pass:
+
+    PA, 1B, wOBA, wRAA, wRC (see add_columns)
+    AVG = H / AB
+    OBP = (H + BB + HBP) / (AB + BB + HBP + SF)
+    SLG = (1B + 2×2B + 3×3B + 4×HR) / AB
+    OPS = OBP + SLG
+    ISO = SLG - AVG
+    BABIP = (H - HR) / (AB - K - HR + SF)
+    K% = K / PA
+    BB% = BB / PA
+    PF = run park factor of the player's school (1.0 if unknown)
+    OPS+ = 100 × (OBP / lgOBP + SLG / lgSLG - 1) / PF
+    wRC+ = 100 × ((wRAA / PA + lgR/PA) + (lgR/PA - PF × lgR/PA)) / lgR/PA
+
+    Linear weights and park factors are each read and joined once for the whole frame.
+    Rates with a zero denominator are 0.00, as are OPS+ and wRC+ for seasons without league OBP, SLG or R/PA
+
+    Parameter school_col: column holding the school name used to look up park factors
+    Precondition: school_col is a str
+    Parameter by_context: if True, use weights of each row's (season, division, conference), see add_columns
+    Precondition: by_context is a bool
     """
-    lw = pd.read_csv(lw_filepath)
-    df.loc[:, 'PA'] = df.apply(lambda x: calculate_pa(x), axis = 1)
-    df.loc[:, '1B'] = df.apply(lambda x: calculate_singles(x), axis = 1)
-    df.loc[:, 'wOBA'] = df.apply(lambda x: calculate_woba(x, weights_df = lw), axis = 1)
-    df.loc[:, 'wRAA'] = df.apply(lambda x: calculate_wraa(x, weights_df = lw), axis = 1)
-    df.loc[:, 'wRC'] = df.apply(lambda x: calculate_wrc(x, weights_df = lw), axis = 1)
-    return df
\ No newline at end of file
+    lw = _weights(df, lw_filepath, by_context)
+    df = _add_columns(df, lw, round_to)
+    pf = park_factors(df, pf_filepath, school_col)
+    col = lambda name: df[name].to_numpy(dtype='float64')
+    pa, ab, h, hr = col('PA'), col('AB'), col('H'), col('HR')
+    avg = _ratio(h, ab)
+    obp = _ratio(h + col('BB') + col('HBP'), ab + col('BB') + col('HBP') + col('SF'))
+    slg = _ratio(col('1B') + 2 * col('2B') + 3 * col('3B') + 4 * hr, ab)
+    lg_runs_per_pa = lw['R/PA'].to_numpy()
+    ops_plus = 100 * (_ratio(obp, lw['OBP']) + _ratio(slg, lw['SLG']) - 1) / pf
+    wrc_plus = 100 * _ratio((_ratio(col('wRAA'), pa) + lg_runs_per_pa) + (lg_runs_per_pa - pf * lg_runs_per_pa), lg_runs_per_pa)
+    has_pa = pa != 0
+    # like wOBA, seasons without league weights get 0.00 rather than a figure computed against 0
+    valid = lambda *names: np.logical_and.reduce([np.nan_to_num(lw[name].to_numpy(dtype='float64')) != 0 for name in names])
+    has_ops_weights = valid('OBP', 'SLG')
+    has_run_weights = valid('R/PA')
+    df.loc[:, 'AVG'] = np.round(avg, round_to)
+    df.loc[:, 'OBP'] = np.round(obp, round_to)
+    df.loc[:, 'SLG'] = np.round(slg, round_to)
+    df.loc[:, 'OPS'] = np.round(obp + slg, round_to)
+    df.loc[:, 'ISO'] = np.round(slg - avg, round_to)
+    df.loc[:, 'BABIP'] = np.round(_ratio(h - hr, ab - col('K') - hr + col('SF')), round_to)
+    df.loc[:, 'K%'] = np.round(_ratio(col('K'), pa), round_to)
+    df.loc[:, 'BB%'] = np.round(_ratio(col('BB'), pa), round_to)
+    df.loc[:, 'PF'] = pf
+    df.loc[:, 'OPS+'] = np.round(np.where(has_pa & has_ops_weights, np.nan_to_num(ops_plus), 0.00), round_to)
+    df.loc[:, 'wRC+'] = np.round(np.where(has_pa & has_run_weights, wrc_plus, 0.00), round_to)
+    return df
@@ -7,19 +7,32 @@ Scraper module for boydsworld.com historical game results
 # Imports
 import pandas as pd
 import numpy as np
-import requests
-from io import StringIO
+import re
+from io import BytesIO
 from datetime import date
-import lxml 
+from lxml import etree
+from cornellbaseball import fetcher
 
 # GLOBALS
 URL = "http://www.boydsworld.com/cgi/scores.pl"
+# number of queries sent to boydsworld at once by get_games_bulk
+MAX_WORKERS = 4
+# columns of the games returned by get_games
+GAME_COLUMNS = ["date", "field", "runs_scored", "runs_allowed", "opponent", "run_difference"]
+# format of the dates in the scores table
+DATE_FORMAT = "%m/%d/%Y"
+# rows of the scores table start with a date, every other row on the page is skipped
+DATE_CELL = re.compile(r"\s*\d{1,2}/\d{1,2}/\d{4}\s*$")
+# the scores table is the second table of a scores.pl page, pages with fewer tables are errors (e.g. "Server busy")
+SCORES_TABLE_COUNT = 2
+TABLE_TAG = re.compile(r"<table\b", re.IGNORECASE)
 
 # MAIN FUNCTION
 def get_games(team_1,start,end=None,team_2="all",col_names=["date", "team_1", "team_1_score", "team_2", "team_2_score", "field"],parse_dates=True,url=URL):
     """
     Returns: a dataframe of all games played for a given team inclusive of given start & end year
-    Data from boydsworld.com
+    Data from boydsworld.com. Empty if the range has no games, raises ValueError if boydsworld did not
+    return a scores table
 
     Parameter team_name: team whose games to select 
     Precondition: lowercase str 
@@ -28,7 +41,11 @@ def get_games(team_1,start,end=None,team_2="all",col_names=["date", "team_1", "t
     Parameter end: the end year of games
     Precondition: end is an int <= 2020
     """
-    df = (load_data(team_1,start,end=end,team_2=team_2,parse_dates=parse_dates,url=url)
+    df = load_data(team_1,start,end=end,team_2=team_2,parse_dates=parse_dates,url=url)
+    if len(df) == 0:
+        # no games in the range, e.g. a season that was not played
+        return pd.DataFrame(columns=GAME_COLUMNS)
+    df = (df
             .pipe(enrich_data,team_1)
             .pipe(set_dtypes)
             .drop(columns=["team_1","team_1_score","team_2","team_2_score"])
@@ -37,6 +54,35 @@ def get_games(team_1,start,end=None,team_2="all",col_names=["date", "team_1", "t
     # boydsworld sometimes struggles with single year inquiries 
     return df
 
+def get_games_bulk(queries, parse_dates=True, url=URL, max_workers=MAX_WORKERS, show_progress=False):
+    """
+    Returns: tuple of (games, errors). games is a single dataframe of the games of many teams, with a team column
+    naming whose perspective each row is from. errors is a dict mapping each query that failed to its exception
+
+    Each query is sent as one ranged request (all of its seasons at once) through the shared, keep-alive
+    session of fetcher, with at most max_workers queries in flight. Failed queries are reported and left out
+
+    Parameter queries: (team_1, start, end) for each team, end may be None to select only games from start.
+    ex. [("Cornell", 1992, 2021), ("Yale", 1992, 2021)]
+    Precondition: queries is a list of tuples
+    Parameter max_workers: number of queries sent at once
+    Precondition: max_workers is an int >= 1
+    """
+    queries = list(queries)
+    tasks = [{"team_1":team_1, "start":start, "end":end, "parse_dates":parse_dates, "url":url} for team_1, start, end in queries]
+    results = fetcher.fetch_all(get_games, tasks, max_workers=max_workers, show_progress=show_progress, print_interval=1)
+    frames = []
+    errors = {}
+    for query, (df, error) in zip(queries, results):
+        if error is not None:
+            print("failed to load games for "+str(query[0])+" "+str(query[1])+" to "+str(query[2] or query[1])+": "+str(error))
+            errors[query] = error
+        elif len(df) > 0:
+            frames.append(df.assign(team=query[0]))
+    if not frames:
+        return pd.DataFrame(columns=GAME_COLUMNS+["team"]), errors
+    return pd.concat(frames, ignore_index=True), errors
+
 # HELPER FUNCTIONS
 def load_data(team_1,start,end=None,team_2="all",col_names=["date", "team_1", "team_1_score", "team_2", "team_2_score", "field"],parse_dates=True,url=URL):
     """
@@ -46,65 +92,97 @@ def load_data(team_1,start,end=None,team_2="all",col_names=["date", "team_1", "t
         end = start
     # build payload
     payload = {"team1":team_1,"firstyear":str(start),"team2":team_2,"lastyear":str(end),"format":"HTML","submit":"Fetch"}
-    # start Requests session
-    s = requests.Session()
-    # send GET request
-    r = requests.get(url, params=payload)
-    response = r.text
-    io = StringIO(response).read()
-    # parse HTML into DataFrame
-    dfs = pd.read_html(io=io, parse_dates=parse_dates)
-    df = dfs[1].dropna(how="all", axis=1)
-    # reset column names
-    if len(df.columns) != len(col_names):
-        print("no records were found. If you believe this is a mistake, please open a bug report")
+    # send GET request over the shared keep-alive session, results of closed seasons are cached on disk.
+    # pages without a scores table are never cached, so a failed query is retried next time
+    response = fetcher.fetch(url, params=payload, season=int(end), validate=has_scores_table)
+    return parse_scores(response, col_names=col_names, parse_dates=parse_dates)
+
+def has_scores_table(html):
+    """
+    Returns: True if a scores.pl page has a scores table (which may hold no games), False for error pages
+    """
+    return len(TABLE_TAG.findall(html)) >= SCORES_TABLE_COUNT
+
+def parse_scores(html, col_names=["date", "team_1", "team_1_score", "team_2", "team_2_score", "field"], parse_dates=True):
+    """
+    Returns: DataFrame of the scores table of a boydsworld scores.pl page, or an empty DataFrame if it has no games.
+    Raises ValueError if the page has no scores table, or a table that does not have the columns of col_names
+
+    The page is parsed as a stream of table rows, each discarded once its cells are read, and only rows
+    starting with a date are kept. Columns that are empty in every row are dropped. Scores are parsed as int
+    and dates with DATE_FORMAT, once for the whole column
+
+    Parameter html: body of a scores.pl response
+    Precondition: html is a str
+    """
+    columns = None
+    tables = 0
+    for _, row in etree.iterparse(BytesIO(html.encode("utf-8")), events=("end",), tag=("tr", "table"), html=True, encoding="utf-8"):
+        if row.tag == "table":
+            tables += 1
+            continue
+        cells = ["".join(cell.itertext()).strip() for cell in row.iterchildren("td", "th")]
+        # free rows already read
+        row.clear()
+        while row.getprevious() is not None:
+            del row.getparent()[0]
+        if not cells or not DATE_CELL.match(cells[0]):
+            continue
+        if columns is None:
+            columns = [[] for _ in cells]
+        if len(cells) == len(columns):
+            for column, value in zip(columns, cells):
+                column.append(value)
+    if tables < SCORES_TABLE_COUNT:
+        raise ValueError("boydsworld did not return a scores table")
+    if columns is None:
+        # a scores table without games
         return pd.DataFrame()
-    df.columns = col_names
+    columns = [column for column in columns if any(column)]
+    # reset column names
+    if len(columns) != len(col_names):
+        raise ValueError("the scores table has "+str(len(columns))+" columns, expected "+str(len(col_names))+". If you believe this is a mistake, please open a bug report")
+    df = pd.DataFrame(dict(zip(col_names, columns)))
+    for col in ("team_1_score", "team_2_score"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col])
     if parse_dates:
-        # make sure dates are parsed as type datetime64[ns]
-#         df = df.astype({"date":"datetime64[ns]"})
-        df['date'] = pd.to_datetime(df['date'], infer_datetime_format=True)
-#         df['date'] = pd.to_datetime(df['date']).dt.date
+        df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT)
     return df
 
 def enrich_data(df, team_1):
     """
-    Returns: copy of the given DataFrame with the following columns added
+    Returns: copy of the given DataFrame, from team_1's perspective, with the following columns added
     
     opponent (str): team_1's opponent for each game.
-    runs_allowed (int): the number of runs scored by team_1 in each game
-    runs_scored (int): the number of runs scored by team_1 in each game
-    run_difference (int): the difference between team_1's runs scored and runs allowed for each game
+    runs_scored (int16): the number of runs scored by team_1 in each game
+    runs_allowed (int16): the number of runs scored by team_1's opponent in each game
+    run_difference (int16): the difference between team_1's runs scored and runs allowed for each game
+
+    team_1 is matched without regard to case, and tied games are kept. Games team_1 did not play in
+    are dropped, and the number dropped is reported
     """
-    wins = df[(df["team_1"] == team_1) & (df["team_1_score"] > df["team_2_score"])].copy()
-    losses = df[(df["team_2"] == team_1) & (df["team_1_score"] > df["team_2_score"])].copy()
-    # set for wins
-    wins.loc[:,"runs_scored"] = wins.loc[:,"team_1_score"]
-    wins.loc[:,"runs_allowed"] = wins.loc[:,"team_2_score"]
-    wins.loc[:,"opponent"] = wins.loc[:,"team_2"]
-    # set for losses
-    losses.loc[:,"runs_scored"] = losses.loc[:,"team_2_score"]
-    losses.loc[:,"runs_allowed"] = losses.loc[:,"team_1_score"]       
-    losses.loc[:,"opponent"] = losses.loc[:,"team_1"]      
-    # combine dfs
-    df = pd.concat([wins,losses])
-    # set run difference 
-    df.loc[:,"run_difference"] = df.loc[:,"runs_scored"] - df.loc[:,"runs_allowed"]
-#     wins.assign(opponent=wins["team_2"])
-#     wins.assign(runs_scored=wins["team_1_score"])
-#     wins.assign(runs_allowed=wins["team_2_score"])
-#     losses.assign(runs_scored=losses["team_2_score"])
-#     losses.assign(runs_allowed=losses["team_1_score"])
-#     losses.assign(opponent=losses["team_1"])
-#     df = pd.concat([wins,losses])
-#     df.assign(run_difference=(df["runs_scored"]-df["runs_allowed"]))
-    return df 
+    team = team_1.lower()
+    # boydsworld lists the winner as team_1, so this is not home and away
+    is_team_1 = (df["team_1"].str.lower() == team).to_numpy()
+    is_team_2 = (df["team_2"].str.lower() == team).to_numpy()
+    played = is_team_1 | is_team_2
+    dropped = len(df) - played.sum()
+    if dropped > 0:
+        print(str(dropped)+" games without "+team_1+" were dropped")
+    df = df[played]
+    is_team_1 = is_team_1[played]
+    team_1_score = df["team_1_score"].to_numpy()
+    team_2_score = df["team_2_score"].to_numpy()
+    runs_scored = np.where(is_team_1, team_1_score, team_2_score).astype(np.int16)
+    runs_allowed = np.where(is_team_1, team_2_score, team_1_score).astype(np.int16)
+    return df.assign(runs_scored=runs_scored,
+                     runs_allowed=runs_allowed,
+                     opponent=np.where(is_team_1, df["team_2"].to_numpy(), df["team_1"].to_numpy()),
+                     run_difference=runs_scored - runs_allowed)
 
 def set_dtypes(df):
     """
-    Sets the datatype of newly added columns
+    Returns: the given DataFrame with runs columns cast to int16, a no-op for the output of enrich_data
     """
-    df.loc[:,"run_difference"] = df.loc[:,"run_difference"].astype(int)
-    df.loc[:,"runs_allowed"] = df.loc[:,"runs_allowed"].astype(int)
-    df.loc[:,"runs_scored"] = df.loc[:,"runs_scored"].astype(int)
-    return df
+    return df.astype({"run_difference":np.int16, "runs_allowed":np.int16, "runs_scored":np.int16})
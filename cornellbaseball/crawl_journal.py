@@ -0,0 +1,85 @@
+"""
+A module to checkpoint long-running crawls so they can be resumed
+
+A journal is a directory. Each completed (stats_player_seq, season_id) result is pickled there as soon as
+it arrives, and failures are appended to failures.txt. Re-running a crawl against the same journal skips
+completed work and retries only what failed or never ran.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import os
+import tempfile
+from datetime import datetime
+import pandas as pd
+
+# GLOBALS
+JOURNAL_DIR = 'data/ncaa/conferences/journals'
+RESULT_SUFFIX = '.df'
+FAILURES_FILENAME = 'failures.txt'
+
+
+def open_journal(name, journal_dir=JOURNAL_DIR):
+    """
+    Returns: (str) path of the journal directory for a given crawl, created if it does not exist
+
+    Parameter name: identifies the crawl, e.g. a conference
+    Precondition: name is a str
+    """
+    path = os.path.join(journal_dir, str(name))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def make_key(stats_player_seq, season_id):
+    """
+    Returns: (str) the journal key of a (stats_player_seq, season_id) pair
+    """
+    return str(stats_player_seq)+'_'+str(season_id)
+
+def completed(journal):
+    """
+    Returns: set of keys that already have a result in the journal
+    """
+    return {f[:-len(RESULT_SUFFIX)] for f in os.listdir(journal) if f.endswith(RESULT_SUFFIX)}
+
+def failed(journal):
+    """
+    Returns: set of keys that have failed and not since completed
+    """
+    path = os.path.join(journal, FAILURES_FILENAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        keys = {line.split('\t')[1] for line in f if line.strip()}
+    return keys - completed(journal)
+
+def record_result(journal, key, df):
+    """
+    Persists the result of one completed task
+
+    The result is written to a temporary file and moved into place, so an interrupted write never
+    leaves a truncated result that would be mistaken for completed work
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=journal, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, os.path.join(journal, key + RESULT_SUFFIX))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def record_failure(journal, key, message):
+    """
+    Appends a failed task to the journal's failures.txt, as: timestamp, key, message (tab separated)
+    """
+    with open(os.path.join(journal, FAILURES_FILENAME), 'a') as f:
+        f.write(datetime.now().isoformat(timespec='seconds')+'\t'+key+'\t'+str(message).replace('\n', ' ')+'\n')
+
+def load_results(journal):
+    """
+    Returns: DataFrame of every result recorded in the journal
+    """
+    files = sorted(f for f in os.listdir(journal) if f.endswith(RESULT_SUFFIX))
+    if not files:
+        return pd.DataFrame()
+    return pd.concat([pd.read_pickle(os.path.join(journal, f)) for f in files])
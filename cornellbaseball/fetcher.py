@@ -0,0 +1,178 @@
+"""
+A module to send polite, rate-limited and concurrent GET requests to stats.ncaa.org
+
+All scraping modules route their requests through fetch, so the requests per second budget
+and the per-host concurrency cap hold across every thread in the process.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+import requests
+from cornellbaseball import response_cache
+
+# GLOBALS
+# NCAA is not kind to robots
+HEADERS = {'User-Agent':'Mozilla/5.0'}
+# maximum number of requests sent per second, across all threads
+REQUESTS_PER_SECOND = 5
+# maximum number of requests in flight to a single host at once
+PER_HOST_LIMIT = 4
+# number of worker threads used by fetch_all
+MAX_WORKERS = 8
+# seconds to wait for a server response before giving up
+REQUEST_TIMEOUT = 30
+
+
+class RateLimiter:
+    """
+    Spaces out calls to wait() so that at most `rate` calls return per second, shared across threads
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_limiter = RateLimiter(REQUESTS_PER_SECOND)
+_host_slots = {}
+_host_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure(requests_per_second=None, per_host_limit=None):
+    """
+    Changes the global request budget for all subsequent requests
+
+    Inputs
+    -----
+    requests_per_second (float): maximum requests per second across all threads. 0 disables the limit
+    (default: None, leave unchanged)
+    per_host_limit (int): maximum number of concurrent requests to a single host
+    (default: None, leave unchanged)
+    """
+    global _limiter, PER_HOST_LIMIT, REQUESTS_PER_SECOND
+    if requests_per_second is not None:
+        REQUESTS_PER_SECOND = requests_per_second
+        _limiter = RateLimiter(requests_per_second)
+    if per_host_limit is not None:
+        PER_HOST_LIMIT = per_host_limit
+        with _host_lock:
+            _host_slots.clear()
+
+def get_session():
+    """
+    Returns: the process-wide requests.Session, created on first use
+
+    The session keeps connections alive and its pool is sized so every worker thread can hold one
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+def _host_slot(url):
+    """
+    Returns: the semaphore bounding concurrent requests to the host of url
+    """
+    host = urlsplit(url).netloc
+    with _host_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return _host_slots[host]
+
+def fetch(url, params=None, headers=HEADERS, timeout=REQUEST_TIMEOUT, season=None, cache=True, validate=None):
+    """
+    Transmits a GET request within the global rate limit and per-host concurrency cap
+
+    Responses are served from response_cache when possible: pages from closed seasons are
+    never downloaded twice, and pages from the current season are revalidated periodically
+
+    Inputs
+    -----
+    url (str)
+    params (dict): query parameters to include with GET request
+    (default: None)
+    headers (dict): to include with GET request
+    (default: {'User-Agent':'Mozilla/5.0'})
+    timeout (float): seconds to wait for a response
+    (default: 30)
+    season (int): the last season whose results can appear on the page, used to decide how long it is cached
+    (default: None, treated as the current season)
+    cache (bool): whether to read from and write to the on-disk response cache
+    (default: True)
+    validate (callable): called as validate(text), returns False for bodies that must not be cached
+    (e.g. an error page served with status 200). Cached bodies it rejects are downloaded again
+    (default: None, cache every successful response)
+
+    Outputs
+    -----
+    str: the body of the response. Raises requests.HTTPError for 4xx/5xx responses (e.g. 403 when NCAA blocks us)
+    """
+    if cache:
+        text = response_cache.load(url, params, season=season)
+        if text is not None and (validate is None or validate(text)):
+            return text
+    with _host_slot(url):
+        _limiter.wait()
+        r = get_session().get(url, params=params, headers=headers, timeout=timeout)
+    r.raise_for_status()
+    if cache and (validate is None or validate(r.text)):
+        response_cache.store(url, r.text, params)
+    return r.text
+
+def fetch_all(func, tasks, max_workers=MAX_WORKERS, callback=None, show_progress=False, print_interval=50):
+    """
+    Calls func(**task) for each task on a bounded pool of worker threads
+
+    func is expected to send its requests through fetch, so the pool never exceeds the global budget
+    no matter how many workers are used.
+
+    Inputs
+    -----
+    func (callable)
+    tasks (list of dict): keyword arguments for each call to func
+    max_workers (int): number of worker threads
+    (default: 8)
+    callback (callable): called as callback(task, result, error) from the calling thread as each task completes
+    (default: None)
+    show_progress (bool): whether to print progress of the crawl
+    (default: False)
+    print_interval (int): if show_progress, the number of completed tasks between progress updates
+    (default: 50)
+
+    Outputs
+    -----
+    list of (result, error) tuples in the same order as tasks. error is None if the call succeeded,
+    otherwise result is None and error is the exception that was raised
+    """
+    tasks = list(tasks)
+    results = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(func, **task): i for i, task in enumerate(tasks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                results[i] = (future.result(), None)
+            except Exception as e:
+                results[i] = (None, e)
+            if callback is not None:
+                callback(tasks[i], *results[i])
+            if show_progress and done % print_interval == 0:
+                print('progress: '+str(done)+' of '+str(len(tasks))+' complete')
+    return results
@@ -0,0 +1,196 @@
+"""
+A module to serve boydsworld.com game results from a local archive, going to the network only for missing seasons
+
+Games are stored as GAME_STORE_PATH/team=<team>/season=<season>/part-0.parquet, one file per team-season.
+A season that has a partition (even an empty one, for a season whose scores table had no games) is archived
+and is always read locally. Failed requests, including error pages without a scores table, are never archived. Seasons not yet archived are fetched from boydsworld, one ranged request per run of missing seasons,
+and appended to the archive once the season has closed. The store is seeded from the csv files under
+data/boydsworld the first time a team is read.
+
+Requires pyarrow.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import functools
+import glob
+import os
+import re
+import pandas as pd
+from cornellbaseball import boydsworld_scraper
+from cornellbaseball import response_cache
+
+# GLOBALS
+GAME_STORE_PATH = 'data/warehouse/games'
+SEED_PATTERN = 'data/boydsworld/*_game_results_*_to_*'
+PART_FILENAME = 'part-0.parquet'
+GAME_DTYPES = {'date':'datetime64[ns]', 'field':'object', 'opponent':'object', 'runs_scored':'int16',
+               'runs_allowed':'int16', 'run_difference':'int16'}
+_SEED_NAME = re.compile(r'(.+)_game_results_(\d{4})_to_(\d{4})$')
+
+
+def _team_key(team):
+    """
+    Returns: (str) the name a team is stored under, boydsworld team names are not case sensitive
+    """
+    return team.strip().lower()
+
+def _partition_path(team, season, root):
+    return os.path.join(root, 'team='+_team_key(team), 'season='+str(season))
+
+def _empty_games():
+    return pd.DataFrame({col:pd.Series(dtype=dtype) for col, dtype in GAME_DTYPES.items()})
+
+def archived_seasons(team, root=GAME_STORE_PATH):
+    """
+    Returns: set of seasons (int) archived for a given team
+    """
+    path = os.path.join(root, 'team='+_team_key(team))
+    if not os.path.isdir(path):
+        return set()
+    return {int(name.split('=', 1)[1]) for name in os.listdir(path) if name.startswith('season=')}
+
+def write_games(games, team, seasons, root=GAME_STORE_PATH):
+    """
+    Archives the games of a team, replacing the given seasons. Seasons without games are archived as empty
+
+    Inputs
+    -----
+    games (DataFrame): games of team, in the format of boydsworld_scraper.get_games
+    team (str): team whose games these are
+    seasons (iterable of int): seasons covered by games
+    root (str): directory of the store
+    (default: 'data/warehouse/games')
+    """
+    games = games.loc[:, list(GAME_DTYPES)].astype(GAME_DTYPES)
+    by_season = dict(tuple(games.groupby(games['date'].dt.year)))
+    for season in seasons:
+        path = _partition_path(team, season, root)
+        os.makedirs(path, exist_ok=True)
+        part = by_season.get(season, _empty_games())
+        tmp = os.path.join(path, PART_FILENAME+'.tmp')
+        part.to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(path, PART_FILENAME))
+
+def seed(pattern=SEED_PATTERN, root=GAME_STORE_PATH, overwrite=False):
+    """
+    Archives the game results csv files (e.g. data/boydsworld/cornell_game_results_1992_to_2020)
+
+    Inputs
+    -----
+    pattern (str): glob of csv files named <team>_game_results_<start>_to_<end>
+    (default: 'data/boydsworld/*_game_results_*_to_*')
+    root (str): directory of the store
+    (default: 'data/warehouse/games')
+    overwrite (bool): whether to replace seasons that are already archived
+    (default: False)
+
+    Outputs
+    -----
+    list of teams seeded
+    """
+    seeded = []
+    for filepath in sorted(glob.glob(pattern)):
+        match = _SEED_NAME.match(os.path.basename(filepath))
+        if match is None:
+            continue
+        team, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+        seasons = set(range(start, end+1))
+        if not overwrite:
+            seasons -= archived_seasons(team, root)
+        if seasons:
+            write_games(pd.read_csv(filepath, parse_dates=['date']), team, sorted(seasons), root)
+            seeded.append(team)
+    return seeded
+
+def _seed_team(team, root):
+    """
+    Seeds the store from a team's csv file, if it has one and nothing is archived for the team yet
+    """
+    if not archived_seasons(team, root):
+        seed(pattern=os.path.join(os.path.dirname(SEED_PATTERN), _team_key(team)+'_game_results_*_to_*'), root=root)
+
+def _missing_runs(seasons):
+    """
+    Returns: list of (start, end) covering consecutive missing seasons, so each run is one ranged request
+    """
+    runs = []
+    for season in sorted(seasons):
+        if runs and runs[-1][1] == season - 1:
+            runs[-1][1] = season
+        else:
+            runs.append([season, season])
+    return [tuple(run) for run in runs]
+
+@functools.lru_cache(maxsize=4096)
+def _read_partition(path, mtime):
+    """
+    Returns: DataFrame of one archived team-season. Cached by modification time, as archived seasons rarely change.
+    Shared by all callers, do not modify in place
+    """
+    return pd.read_parquet(path)
+
+def _read_seasons(team, seasons, root):
+    paths = [os.path.join(_partition_path(team, season, root), PART_FILENAME) for season in seasons]
+    frames = [_read_partition(path, os.path.getmtime(path)) for path in paths]
+    return [frame for frame in frames if len(frame) > 0]
+
+def load_games(queries, root=GAME_STORE_PATH, max_workers=boydsworld_scraper.MAX_WORKERS):
+    """
+    Returns: a single dataframe of the games of many teams, with a team column, see get_games
+
+    Missing seasons of every team are fetched concurrently, one ranged request per run of missing seasons.
+    Seasons that fail to load are reported and left out
+
+    Parameter queries: (team, start, end) for each team, end may be None to select only games from start
+    Precondition: queries is a list of tuples
+    """
+    current = response_cache.current_season()
+    wanted = []
+    runs = []
+    for team, start, end in queries:
+        seasons = list(range(start, (start if end is None else end)+1))
+        _seed_team(team, root)
+        missing = set(seasons) - archived_seasons(team, root)
+        wanted.append((team, seasons))
+        runs += [(team, first, last) for first, last in _missing_runs(missing)]
+    fetched, errors = boydsworld_scraper.get_games_bulk(runs, max_workers=max_workers)
+    fetched = fetched.astype(GAME_DTYPES)
+    fetched_seasons = fetched['date'].dt.year
+    for run in runs:
+        if run in errors:
+            continue
+        team, first, last = run
+        games = fetched[(fetched['team'] == team) & fetched_seasons.between(first, last)]
+        # only closed seasons are archived, the current one is refetched until it ends
+        write_games(games, team, [season for season in range(first, last+1) if season < current], root)
+    frames = []
+    for team, seasons in wanted:
+        archived = archived_seasons(team, root)
+        parts = _read_seasons(team, [season for season in seasons if season in archived], root)
+        # seasons fetched but not archived (the current season)
+        unarchived = [season for season in seasons if season not in archived]
+        if unarchived:
+            parts.append(fetched[(fetched['team'] == team) & fetched_seasons.isin(unarchived)].drop(columns=['team']))
+        parts = [part for part in parts if len(part) > 0]
+        if parts:
+            frames.append(pd.concat(parts, ignore_index=True).assign(team=team))
+    if not frames:
+        return _empty_games().assign(team=pd.Series(dtype='object'))
+    res = pd.concat(frames, ignore_index=True)
+    return res.sort_values(by=['team', 'date'], kind='stable', ignore_index=True)
+
+def get_games(team, start, end=None, root=GAME_STORE_PATH):
+    """
+    Returns: a dataframe of all games played for a given team inclusive of given start & end year,
+    in the format of boydsworld_scraper.get_games
+
+    Archived seasons are read locally, only seasons not yet archived are requested from boydsworld.com
+
+    Parameter team: team whose games to select, ex. "Cornell"
+    Precondition: team is a str
+    Parameter start: the start year of games
+    Precondition: start is an int >= 1992
+    Parameter end: the end year of games. To select only games from start, leave None
+    Precondition: end is an int or None
+    """
+    return load_games([(team, start, end)], root=root).drop(columns=['team'])
@@ -0,0 +1,147 @@
+"""
+A module to derive league run environments, wOBA linear weights and FIP constants from player-season totals
+
+Produces the same columns as data/guts/ncaa_d1_woba_linear_weights.csv, so constants can be recomputed
+each season, or for any conference or division, instead of being updated by hand.
+All sums are taken with a single groupby, so every D1 player-season is processed in one pass.
+
+Linear weights follow Tom Tango's derivation from season totals (as used by FanGraphs):
+runs per out sets the value of an out, each event's run value is offset from a walk's, and the weights are
+scaled so that league wOBA is on the scale of league OBP.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import numpy as np
+import pandas as pd
+from cornellbaseball import pitching_metrics
+
+# GLOBALS
+# run values of events relative to a walk (Tango)
+RUN_BB_OVER_OUT = 0.14
+RUN_HBP_OVER_BB = 0.025
+RUN_1B_OVER_BB = 0.155
+RUN_2B_OVER_1B = 0.3
+RUN_3B_OVER_2B = 0.27
+RUN_HR = 1.4
+RUN_SB = 0.2
+RUN_CS_OVER_OUTS = 0.075
+# columns of the linear weights csv, after the grouping columns
+GUTS_COLUMNS = ['wOBA', 'wOBAScale', 'wBB', 'wHBP', 'w1B', 'w2B', 'w3B', 'wHR', 'R/PA', 'RPG', 'cFIP',
+                'AVG', 'OBP', 'SLG', 'HR_FB', '1B', '2B', '3B', 'HR', 'BB', 'HBP', 'SO', 'ERA', 'PAs', 'IP', 'Games']
+# columns the csv stores as percentages of plate appearances
+PERCENT_COLUMNS = ['HR_FB', '1B', '2B', '3B', 'HR', 'BB', 'HBP', 'SO']
+BATTING_COLUMNS = ['AB', 'H', '2B', '3B', 'HR', 'BB', 'IBB', 'HBP', 'SF', 'SH', 'K', 'R', 'SB', 'CS']
+PITCHING_COLUMNS = ['outs', 'ER', 'HR-A', 'BB', 'HB', 'SO']
+
+
+def _team_games(batting, by, team_col):
+    """
+    Returns: Series of team-games per group, counting each team's games once (its most games played by a player)
+    """
+    if team_col not in batting.columns or 'GP' not in batting.columns:
+        return None
+    team_games = batting.groupby(by + [team_col])['GP'].max()
+    return team_games.groupby(level=list(range(len(by)))).sum()
+
+def derive_linear_weights(batting, pitching=None, by=('season',), team_col='school_id', fip_hr_weight=pitching_metrics.FIP_HR_WEIGHT, fip_bb_weight=pitching_metrics.FIP_BB_WEIGHT, fip_k_weight=pitching_metrics.FIP_K_WEIGHT):
+    """
+    Returns: DataFrame of league constants, one row per group, with the columns of the linear weights csv
+
+    Inputs
+    -----
+    batting (DataFrame): player-season batting totals with by columns and AB, H, 2B, 3B, HR, BB, IBB, HBP,
+    SF, SH, K, R, SB, CS (GP and team_col are used to count games if present)
+    pitching (DataFrame): player-season pitching totals with by columns and IP or outs, ER, HR-A, BB, HB, SO.
+    Needed for cFIP, ERA and an exact count of outs. Without it, ERA and cFIP are NaN and outs are estimated
+    from batting as AB - H + SF + SH + CS
+    (default: None)
+    by (tuple of str): columns to group on, e.g. ('season', 'division') or ('season', 'conference')
+    (default: ('season',))
+    team_col (str): column identifying a player's team
+    (default: 'school_id')
+
+    Outputs
+    -----
+    DataFrame with by columns ('season' renamed to 'Season') followed by GUTS_COLUMNS. Rates are fractions,
+    use format_guts to write them in the csv's format. HR_FB is NaN (batted ball data is not scraped)
+    """
+    by = list(by)
+    bat = batting.loc[:, by + BATTING_COLUMNS].copy()
+    bat[BATTING_COLUMNS] = bat[BATTING_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+    lg = bat.groupby(by).sum()
+    singles = lg['H'] - lg['2B'] - lg['3B'] - lg['HR']
+    unintentional_bb = lg['BB'] - lg['IBB']
+    pa = lg['AB'] + lg['BB'] + lg['SF'] + lg['SH'] + lg['HBP'] - lg['IBB']
+
+    if pitching is not None:
+        pit = pitching.copy()
+        if 'outs' not in pit.columns:
+            pit['outs'] = pitching_metrics.ip_to_outs(pit['IP'])
+        pit = pit.loc[:, by + PITCHING_COLUMNS]
+        pit[PITCHING_COLUMNS] = pit[PITCHING_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+        lg_pit = pit.groupby(by).sum().reindex(lg.index)
+        outs = lg_pit['outs']
+        ip = outs / 3
+        era = 9 * lg_pit['ER'] / ip
+        cfip = era - ((fip_hr_weight * lg_pit['HR-A']) + (fip_bb_weight * (lg_pit['BB'] + lg_pit['HB'])) - (fip_k_weight * lg_pit['SO'])) / ip
+    else:
+        outs = lg['AB'] - lg['H'] + lg['SF'] + lg['SH'] + lg['CS']
+        ip = outs / 3
+        era = cfip = pd.Series(np.nan, index=lg.index)
+
+    # run values of each event
+    runs_per_out = lg['R'] / outs
+    run_bb = runs_per_out + RUN_BB_OVER_OUT
+    run_hbp = run_bb + RUN_HBP_OVER_BB
+    run_1b = run_bb + RUN_1B_OVER_BB
+    run_2b = run_1b + RUN_2B_OVER_1B
+    run_3b = run_2b + RUN_3B_OVER_2B
+    run_cs = 2 * runs_per_out + RUN_CS_OVER_OUTS
+    event_runs = (run_bb * unintentional_bb + run_hbp * lg['HBP'] + run_1b * singles + run_2b * lg['2B']
+                  + run_3b * lg['3B'] + RUN_HR * lg['HR'] + RUN_SB * lg['SB'] - run_cs * lg['CS'])
+    run_minus = event_runs / (lg['AB'] - lg['H'] + lg['SF'])
+    run_plus = event_runs / (unintentional_bb + lg['HBP'] + lg['H'])
+    woba_scale = 1 / (run_plus + run_minus)
+
+    res = pd.DataFrame(index=lg.index)
+    res['wBB'] = (run_bb + run_minus) * woba_scale
+    res['wHBP'] = (run_hbp + run_minus) * woba_scale
+    res['w1B'] = (run_1b + run_minus) * woba_scale
+    res['w2B'] = (run_2b + run_minus) * woba_scale
+    res['w3B'] = (run_3b + run_minus) * woba_scale
+    res['wHR'] = (RUN_HR + run_minus) * woba_scale
+    res['wOBA'] = ((res['wBB'] * unintentional_bb + res['wHBP'] * lg['HBP'] + res['w1B'] * singles + res['w2B'] * lg['2B']
+                    + res['w3B'] * lg['3B'] + res['wHR'] * lg['HR'])
+                   / (lg['AB'] + unintentional_bb + lg['SF'] + lg['HBP']))
+    res['wOBAScale'] = woba_scale
+    res['R/PA'] = lg['R'] / pa
+    games = _team_games(batting, by, team_col)
+    res['Games'] = games.reindex(lg.index) if games is not None else np.nan
+    res['RPG'] = lg['R'] / res['Games']
+    res['cFIP'] = cfip
+    res['AVG'] = lg['H'] / lg['AB']
+    res['OBP'] = (lg['H'] + lg['BB'] + lg['HBP']) / (lg['AB'] + lg['BB'] + lg['HBP'] + lg['SF'])
+    res['SLG'] = (singles + 2 * lg['2B'] + 3 * lg['3B'] + 4 * lg['HR']) / lg['AB']
+    res['HR_FB'] = np.nan
+    res['1B'] = singles / pa
+    for col in ['2B', '3B', 'HR', 'BB', 'HBP']:
+        res[col] = lg[col] / pa
+    res['SO'] = lg['K'] / pa
+    res['ERA'] = era
+    res['PAs'] = pa
+    res['IP'] = ip
+    res = res.loc[:, GUTS_COLUMNS].reset_index()
+    return res.rename(columns={'season':'Season'})
+
+def format_guts(df):
+    """
+    Returns: copy of a derive_linear_weights result rounded and formatted like ncaa_d1_woba_linear_weights.csv
+    (rates written as percentages), ready for to_csv(index=False)
+    """
+    df = df.copy()
+    df[['wOBA', 'wOBAScale', 'R/PA', 'RPG', 'cFIP', 'AVG', 'OBP', 'SLG', 'ERA']] = df[['wOBA', 'wOBAScale', 'R/PA', 'RPG', 'cFIP', 'AVG', 'OBP', 'SLG', 'ERA']].round(3)
+    df[['wBB', 'wHBP', 'w1B', 'w2B', 'w3B', 'wHR']] = df[['wBB', 'wHBP', 'w1B', 'w2B', 'w3B', 'wHR']].round(5)
+    for col in PERCENT_COLUMNS:
+        df[col] = (df[col] * 100).map(lambda x: '' if pd.isna(x) else f'{x:.2f}%')
+    df['IP'] = df['IP'].round(0)
+    return df
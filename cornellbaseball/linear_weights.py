@@ -0,0 +1,132 @@
+"""
+A module to serve linear weights by context: (season, division, conference)
+
+Weights are registered per context, either from a table (e.g. the D1 csv) or derived from player-seasons with
+league_constants. Each context level is kept as one cached table indexed by its keys, so joining weights onto
+hundreds of thousands of player rows is a handful of index lookups rather than a boolean mask per row.
+
+A row is given the weights of the most specific context available:
+(season, division, conference), then (season, division), then season alone (D1 weights by default).
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import threading
+import numpy as np
+import pandas as pd
+from cornellbaseball import league_constants
+
+# GLOBALS
+LW_FILEPATH = 'data/guts/ncaa_d1_woba_linear_weights.csv' # <-- Robert Fray's Linear Weights
+# context levels, most specific first
+LEVELS = [('division', 'conference'), ('division',), ()]
+# numeric columns served for each context
+WEIGHT_COLUMNS = ['wOBA', 'wOBAScale', 'wBB', 'wHBP', 'w1B', 'w2B', 'w3B', 'wHR', 'R/PA', 'RPG', 'cFIP', 'AVG', 'OBP', 'SLG']
+
+_contexts = {} # (division, conference) -> weights indexed by Season
+_level_tables = {} # level -> weights of every registered context at that level, indexed by (Season, *level)
+_lock = threading.Lock()
+
+
+def register_weights(weights, division=None, conference=None):
+    """
+    Registers a table of weights, one row per season, for a given context
+
+    Parameter weights: linear weights with a Season column, e.g. the D1 csv or derive_linear_weights output
+    Precondition: weights is a DataFrame
+    Parameter division: NCAA division, or None for any division
+    Precondition: division is an int or None
+    Parameter conference: conference name, or None for any conference. Requires division
+    Precondition: conference is a str or None
+    """
+    if conference is not None and division is None:
+        raise ValueError("a conference context must also specify its division")
+    table = weights.drop_duplicates(subset='Season').set_index('Season').loc[:, WEIGHT_COLUMNS].astype('float64')
+    with _lock:
+        _contexts[(division, conference)] = table
+        _level_tables.clear()
+
+def build_weights(batting, pitching=None):
+    """
+    Derives and registers weights for every (season, division) and (season, division, conference) found in batting
+
+    Inputs
+    -----
+    batting (DataFrame): player-season batting totals with season, division and conference columns,
+    see league_constants.derive_linear_weights
+    pitching (DataFrame): player-season pitching totals with the same context columns, for cFIP
+    (default: None)
+    """
+    for by in (('season', 'division'), ('season', 'division', 'conference')):
+        derived = league_constants.derive_linear_weights(batting, pitching, by=by)
+        for key, table in derived.groupby(list(by[1:])):
+            key = key if isinstance(key, tuple) else (key,)
+            register_weights(table, division=int(key[0]), conference=key[1] if len(key) > 1 else None)
+
+def clear():
+    """
+    Removes every registered context, the D1 csv is reloaded on next use
+    """
+    with _lock:
+        _contexts.clear()
+        _level_tables.clear()
+
+def _level_table(level):
+    """
+    Returns: DataFrame of weights of every context registered at a level, indexed by (Season, *level), or None
+    """
+    with _lock:
+        if level in _level_tables:
+            return _level_tables[level]
+        if level == () and (None, None) not in _contexts:
+            _contexts[(None, None)] = (pd.read_csv(LW_FILEPATH).drop_duplicates(subset='Season')
+                                       .set_index('Season').loc[:, WEIGHT_COLUMNS].astype('float64'))
+        tables = {key:table for key, table in _contexts.items()
+                  if all(value is not None for value in key[:len(level)]) and all(value is None for value in key[len(level):])}
+        if not tables:
+            res = None
+        elif level == ():
+            res = tables[(None, None)]
+        else:
+            res = pd.concat({(key[0] if len(level) == 1 else key[:len(level)]):table for key, table in tables.items()}, names=list(level))
+            res = res.reorder_levels(['Season'] + list(level))
+        _level_tables[level] = res
+        return res
+
+def join_weights(df, season_col='season', division_col='division', conference_col='conference'):
+    """
+    Returns: DataFrame of WEIGHT_COLUMNS for each row of df, aligned with df's index
+
+    Each row gets the most specific registered context matching its season, division and conference.
+    Context columns missing from df are skipped. Rows with no matching season get NaN
+
+    Parameter df: player rows with at least a season column
+    Precondition: df is a DataFrame
+    """
+    seasons = pd.to_numeric(df[season_col], errors='coerce').to_numpy()
+    columns = {'division':division_col, 'conference':conference_col}
+    res = np.full((len(df), len(WEIGHT_COLUMNS)), np.nan)
+    remaining = np.ones(len(df), dtype=bool)
+    for level in LEVELS:
+        if not remaining.any():
+            break
+        if any(columns[name] not in df.columns for name in level):
+            continue
+        table = _level_table(level)
+        if table is None:
+            continue
+        if level == ():
+            keys = pd.Index(seasons)
+        else:
+            keys = pd.MultiIndex.from_arrays([seasons] + [df[columns[name]].to_numpy() for name in level])
+        indexer = table.index.get_indexer(keys)
+        take = remaining & (indexer >= 0)
+        res[take] = table.to_numpy()[indexer[take]]
+        remaining &= ~take
+    return pd.DataFrame(res, index=df.index, columns=WEIGHT_COLUMNS)
+
+def get_weights(season, division=None, conference=None):
+    """
+    Returns: Series of the weights for a single context, falling back to less specific contexts
+    """
+    row = pd.DataFrame({'season':[season], 'division':[division], 'conference':[conference]})
+    return join_weights(row).iloc[0]
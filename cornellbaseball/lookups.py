@@ -0,0 +1,93 @@
+"""
+A module to serve the NCAA lookup tables (season ids, schools, conferences, divisions)
+
+Each table is read from disk once per process, the first time it is needed, and indexed into dicts so
+every later lookup is O(1). Crawls that look up a season id per roster no longer re-parse the CSV each time.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import functools
+import pandas as pd
+
+# LOOKUP PATHS
+SEASON_ID_LU_PATH = 'data/ncaa/ncaa_seasonid_lu.csv'
+SCHOOL_ID_LU_PATH = 'data/ncaa/school_lookup.csv'
+TEAM_LU_PATH = 'data/ncaa/master_ncaa_team_lu.csv'
+
+
+@functools.lru_cache(maxsize=None)
+def season_table(path=SEASON_ID_LU_PATH):
+    """
+    Returns: DataFrame of season, id, batting_id, pitching_id. Shared by all callers, do not modify in place
+    """
+    return pd.read_csv(path).iloc[:, 1:]
+
+@functools.lru_cache(maxsize=None)
+def _season_index(path=SEASON_ID_LU_PATH):
+    df = season_table(path)
+    by_season = {int(row.season): (int(row.id), int(row.batting_id), int(row.pitching_id)) for row in df.itertuples()}
+    by_id = {season_id: season for season, (season_id, _, _) in by_season.items()}
+    return by_season, by_id
+
+def season_ids(season, path=SEASON_ID_LU_PATH):
+    """
+    Returns: tuple of (season_id, batting_id, pitching_id) for a given season. Raises KeyError if unknown
+    """
+    return _season_index(path)[0][int(season)]
+
+def season_of(season_id, path=SEASON_ID_LU_PATH):
+    """
+    Returns: (int) the season a given season_id (game_sport_year_ctl_id) belongs to. Raises KeyError if unknown
+    """
+    return _season_index(path)[1][int(season_id)]
+
+def season_of_year(years):
+    """
+    Returns: Series (Int64) of the season each academic year is played in, the year it ends in: '2012-13' -> 2013
+
+    Parameter years: academic years as written by stats.ncaa.org, e.g. the Year column of a career stats table
+    Precondition: years is a Series of str
+    """
+    return (pd.to_numeric(years.astype('string').str[:4]) + 1).astype('Int64')
+
+@functools.lru_cache(maxsize=None)
+def school_table(path=SCHOOL_ID_LU_PATH):
+    """
+    Returns: DataFrame of school, conference, school_id, year, division, conference_id.
+    Shared by all callers, do not modify in place
+    """
+    return pd.read_csv(path).iloc[:, 1:]
+
+@functools.lru_cache(maxsize=None)
+def _school_index(path=SCHOOL_ID_LU_PATH):
+    df = school_table(path).drop_duplicates(subset=['school_id', 'year'])
+    by_school_year = {}
+    by_school = {}
+    for row in df.sort_values(by='year').itertuples():
+        info = {'school':row.school, 'conference':row.conference, 'division':int(row.division), 'conference_id':row.conference_id}
+        by_school_year[(int(row.school_id), int(row.year))] = info
+        by_school[int(row.school_id)] = info # sorted by year, so the most recent season wins
+    return by_school_year, by_school
+
+def school_info(school_id, year=None, path=SCHOOL_ID_LU_PATH):
+    """
+    Returns: dict of school, conference, division, conference_id for a given school. Raises KeyError if unknown
+
+    Parameter year: season to look up, schools change conferences. None returns the most recent season
+    Precondition: year is an int or None
+    """
+    by_school_year, by_school = _school_index(path)
+    if year is None:
+        return by_school[int(school_id)]
+    return by_school_year[(int(school_id), int(year))]
+
+@functools.lru_cache(maxsize=None)
+def _division_index(path=TEAM_LU_PATH):
+    df = pd.read_csv(path).iloc[:, 1:].drop_duplicates(subset=['school', 'year'])
+    return {(row.school, int(row.year)): int(row.division) for row in df.itertuples()}
+
+def division(school, year, path=TEAM_LU_PATH):
+    """
+    Returns: (int) the NCAA division of a school (by name, e.g. 'Cornell') in a given season. Raises KeyError if unknown
+    """
+    return _division_index(path)[(school, int(year))]
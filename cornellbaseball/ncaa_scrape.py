@@ -5,18 +5,61 @@ created by Nathan Blumenfeld for Cornell Baseball
 """
 
 import pandas as pd
-import time
-import random
-from bs4 import BeautifulSoup
 import requests
 import numpy as np
+import re
+import functools
+import lxml.html
+from lxml import etree
+from cornellbaseball import fetcher
+from cornellbaseball import crawl_journal
+from cornellbaseball import lookups
+from cornellbaseball import warehouse
+from cornellbaseball import pitching_metrics
+from cornellbaseball.record_buffer import RecordBuffer
 
 # LOOKUP PATHS
-SCHOOL_ID_LU_PATH = 'data/ncaa/school_lookup.csv'
-SEASON_ID_LU_PATH = 'data/ncaa/ncaa_seasonid_lu.csv'
+SCHOOL_ID_LU_PATH = lookups.SCHOOL_ID_LU_PATH
+SEASON_ID_LU_PATH = lookups.SEASON_ID_LU_PATH
 PLAYER_LU_PATH = 'data/ncaa/players_clean.df'
 
-def get_roster(school_id, year, season_id_lu_path = SEASON_ID_LU_PATH, headers = {'User-Agent':'Mozilla/5.0'}):     
+# a career stats page keeps changing until the player's eligibility runs out
+MAX_CAREER_SEASONS = 6
+
+# cells made up only of dashes and whitespace are nulls
+NULL_PATTERN = r'^[\s-]*-[\s-]*$'
+
+# stats table column -> dtype applied by transform_career_stats
+STAT_COLUMNS = {
+    # batting
+    'GP':'float64', 'GS':'float64', 'AB':'float64', 'R':'float64', 'H':'float64', '2B':'float64', '3B':'float64',
+    'HR':'float64', 'TB':'float64', 'RBI':'float64', 'RBI2out':'float64', 'BB':'float64', 'HBP':'float64',
+    'IBB':'float64', 'SF':'float64', 'SH':'float64', 'K':'float64', 'DP':'float64', 'SB':'float64', 'CS':'float64',
+    'Picked':'float64', 'BA':'float64', 'OBPct':'float64', 'SlgPct':'float64', 'G':'float64', 'OPP DP':'float64',
+    # pitching
+    'App':'float64', 'IP':'float64', 'ER':'float64', 'SO':'float64', 'HR-A':'float64', 'HB':'float64', 'BF':'float64',
+    '2B-A':'float64', '3B-A':'float64', 'WP':'float64', 'Bk':'float64', 'W':'float64', 'L':'float64', 'SV':'float64',
+    'ERA':'float64', 'Pitches':'float64', 'CG':'float64', 'SHO':'float64', 'P-OAB':'float64', 'Inh Run':'float64',
+    'Inh Run Score':'float64', 'SHA':'float64', 'SFA':'float64', 'GO':'float64', 'FO':'float64', 'KL':'float64',
+    'pickoffs':'float64',
+}
+
+# headers identifying the career stats table of a player page and the stats table of a team page
+CAREER_SIGNATURE = ('Year', 'Team')
+TEAM_STATS_SIGNATURE = ('Player', 'Yr', 'Pos')
+
+# roster table header (lowercase) -> column name
+ROSTER_COLUMNS = {'jersey':'jersey', 'player':'name', 'pos':'position', 'ht':'height', 'yr':'class_year', 'class':'class_year', 'gp':'games_played', 'gs':'games_started'}
+
+# compiled once, reused for every roster page
+_ROSTER_TABLE = etree.XPath("//table[.//th[normalize-space()='Player']]")
+_HEADER_CELLS = etree.XPath("(.//tr[th])[1]/th")
+_BODY_ROWS = etree.XPath(".//tr[td]")
+_CELLS = etree.XPath("./td")
+_LINK_HREF = etree.XPath(".//a/@href")
+_PLAYER_SEQ = re.compile(r'stats_player_seq=(\d+)|(\d+)$')
+
+def get_roster(school_id, year, season_id_lu_path = SEASON_ID_LU_PATH, headers = fetcher.HEADERS):     
     """
     Transmits GET request to stats.ncaa.org, parses roster information into DataFrame
 
@@ -41,56 +84,110 @@ def get_roster(school_id, year, season_id_lu_path = SEASON_ID_LU_PATH, headers =
 
     """
     # get season_id from lookup table
-    season_lu = pd.read_csv(SEASON_ID_LU_PATH).iloc[:,1:]
-    season_id = season_lu[season_lu.season == year].id.values[0]
+    season_id = lookups.season_ids(year, season_id_lu_path)[0]
     # doesn't take regular params, have to build url manually
-    r = requests.get(f"""https://stats.ncaa.org/team/{str(school_id)}/roster/{str(season_id)}""", headers=headers)
-    soup = BeautifulSoup(r.text, features='lxml')
+    html = fetcher.fetch(f"""https://stats.ncaa.org/team/{str(school_id)}/roster/{str(season_id)}""", headers=headers, season=year, validate=has_roster_table)
+    return parse_roster(html)
+
+def _document(html):
+    """
+    Returns: the parsed root element of a page, or None if html is empty or not a document
+    """
+    try:
+        return lxml.html.document_fromstring(html)
+    except etree.ParserError:
+        return None
+
+def has_roster_table(html):
+    """
+    Returns: True if a roster page has a roster table, False for error and throttle pages, which must not be cached
+    """
+    root = _document(html)
+    return root is not None and len(_ROSTER_TABLE(root)) > 0
+
+def has_stats_table(html, signature):
+    """
+    Returns: True if a page has a stats table whose headers include every name in signature (see parse_stats_table),
+    False for error and throttle pages, which must not be cached
+    """
+    root = _document(html)
+    return root is not None and len(_stats_table_xpath(tuple(signature))(root)) > 0
+
+def parse_roster(html):
+    """
+    Parses the roster table of a stats.ncaa.org roster page into a DataFrame
+
+    Columns are read by header name, so seasons with extra columns (e.g. 'height' in 2019) need no special
+    handling. stats_player_seq is taken from each player's link; players without one (0 games played) get None.
+
+    Inputs
+    -----
+    html (str): roster page
+
+    Outputs
+    -----
+    DataFrame with one row per player and a column per table header, renamed according to ROSTER_COLUMNS,
+    with stats_player_seq inserted before name
+    """
+    root = lxml.html.document_fromstring(html)
+    tables = _ROSTER_TABLE(root)
+    if not tables:
+        return pd.DataFrame()
+    table = tables[0]
+    col_names = []
+    for th in _HEADER_CELLS(table):
+        header = th.text_content().strip()
+        name = ROSTER_COLUMNS.get(header.lower(), header.lower().replace(' ', '_'))
+        if name == 'name':
+            col_names.append('stats_player_seq')
+        col_names.append(name)
+    name_index = col_names.index('name') - 1 if 'name' in col_names else None
     res = []
-    if year == 2019: # records from 2019 season contain an additional field: 'height'
-        num_values = 7
-        col_names = ['jersey', 'stats_player_seq', 'name', 'position', 'height', 'class_year', 'games_played', 'games_started']
-    else:
-        num_values = 6
-        col_names = ['jersey', 'stats_player_seq', 'name', 'position', 'class_year', 'games_played', 'games_started']
-    for index, value in enumerate(soup.find_all('td')):
-        if index % num_values == 0: # each player has 6 associated values in table
-            details = [] # new list for each players
-            res.append(details) # DataFrame deals with extra list for us
-        if index % num_values == 1: # need to get stats_player_seq from href tag
-            try: # not sure if there is a way to do with w/o catching an error, but it works.
-                details.append((value.contents[0].get('href')[-7:])) # 7-digit id
-                details.append(value.contents[0].string) # player name
-            except:
-                details.append(None) # no id found (occurs when players has 0 games played)
-                details.append(value.contents[0]) # player name
-        else:
-            try:
-                details.append(value.contents[0])
-            except:
-                details.append(None)
-    df = pd.DataFrame(res)
-    df.columns = col_names
-    return df
+    for tr in _BODY_ROWS(table):
+        details = []
+        for index, td in enumerate(_CELLS(tr)):
+            if index == name_index:
+                href = _LINK_HREF(td)
+                match = _PLAYER_SEQ.search(href[0]) if href else None
+                details.append((match.group(1) or match.group(2)) if match else None)
+            text = td.text_content().strip()
+            details.append(text if text != '' else None)
+        res.append(details)
+    return pd.DataFrame(res, columns=col_names)
+
+def get_multiyear_roster(school_id, start, end, max_workers=fetcher.MAX_WORKERS):
+    """
+    Calls get_roster concurrently for each season from start to end, inclusive
+
+    Inputs
+    -----
+    school_id (int)
+    start (int)
+    end (int)
+    max_workers (int): number of rosters requested at once, within fetcher's global rate limit
+    (default: 8)
 
-def get_multiyear_roster(school_id, start, end, request_timeout=0.1):
-    seasons = pd.read_csv('data/ncaa/ncaa_seasonid_lu.csv')
-    roster = pd.DataFrame()
-    for year in range(start, end+1):
-        new = get_roster(school_id, year) 
-        new['season'] = year
-        new['school_id'] = school_id
+    Outputs
+    -----
+    DataFrame of (player, season) records with season_id, batting_id and pitching_id
+    """
+    seasons = lookups.season_table()
+    roster = RecordBuffer()
+    tasks = [{'school_id':school_id, 'year':year} for year in range(start, end+1)]
+    for task, (new, error) in zip(tasks, fetcher.fetch_all(get_roster, tasks, max_workers=max_workers)):
+        year = task['year']
+        if error is not None:
+            print('failure: roster for school_id '+str(school_id)+' in '+str(year)+' ('+str(error)+')')
+            continue
         if 'height' in new.columns: 
             new = new.drop(columns = ['height'])
-        roster = pd.concat([roster, new])
-        time.sleep(random.uniform(0, request_timeout))
-        
-    roster = pd.merge(roster, seasons, how = 'left', on = 'season')
+        roster.append(new, season=year, school_id=school_id)
+
+    roster = pd.merge(roster.to_frame(), seasons, how = 'left', on = 'season')
     roster = roster.rename(columns={'id':'season_id'})
-    roster = roster.drop(columns=['Unnamed: 0'])
     return roster
     
-def get_career_stats(stats_player_seq, season_id, school_id, headers = {'User-Agent':'Mozilla/5.0'}):
+def get_career_stats(stats_player_seq, season_id, school_id, headers = fetcher.HEADERS):
     """
     Transmits GET request to stats.ncaa.org, parses career stats  into DataFrame
 
@@ -110,47 +207,89 @@ def get_career_stats(stats_player_seq, season_id, school_id, headers = {'User-Ag
     # craft GET request to NCAA site
     payload = {'game_sport_year_ctl_id':str(season_id), 'stats_player_seq':str(stats_player_seq), 'org_id':str(school_id)}
     url = 'https://stats.ncaa.org/player/game_by_game'
+    # later seasons of the player's career are added to the same page
+    try:
+        last_season = get_season(season_id) + MAX_CAREER_SEASONS - 1
+    except KeyError:
+        # season_id is newer than the lookup table, the page is cached as a current season page
+        last_season = None
     # send request
     try:
-        r = requests.get(url, params = payload, headers = headers)
-    except:
+        html = fetcher.fetch(url, params = payload, headers = headers, season = last_season, validate = functools.partial(has_stats_table, signature = CAREER_SIGNATURE))
+    except requests.RequestException as e:
         print('An error occurred with the GET Request')
-        if r.status_code == 403:
+        if getattr(e.response, 'status_code', None) == 403:
             print('403 Error: NCAA blocked request')
         return pd.DataFrame()
-    # parse data
-    soup = BeautifulSoup(r.text, features = 'lxml')
-    table = soup.find_all('table')[2]
-
-    # get table headers
-    headers = []
-    for val in table.find_all('th'):
-        headers.append(val.string.strip())
-        
-    # get table data
-    rows = []
-    row = []
-    for val in table.find_all('td'): # TODO: cleanup as much as possible
-        # data is also encoded in data-order attr of td elements
-        if 'data-order' in val.attrs:
-            row.append(val['data-order'])
-        elif val.a is not None:
-            row.append(val.a.attrs['href'].split('/')[2])
-        elif val.string.strip() != 'Career' and 'width' not in val.attrs:
-            if row != []:
-                rows.append(row)
-            row = []
-            row.append(val.string.strip())
-        else:
-            if val.string.strip() != 'Career':
-                row.append(val.string.strip())
-
-    # Turn into DataFrame
-    df = pd.DataFrame(rows)
-    df.columns = headers
+    # parse data, the career table is the one with both a 'Year' and a 'Team' column
+    df = parse_stats_table(html, signature=CAREER_SIGNATURE, link_ids=True, skip_rows=('Career',))
     df = transform_career_stats(df)
     return df
 
+def parse_stats_table(html, signature, link_ids=False, skip_rows=()):
+    """
+    Parses a stats table from a stats.ncaa.org page into a DataFrame of column arrays
+
+    The table is located by its header signature rather than its position on the page, and every
+    row is read as a whole, so a row with a missing or extra cell is dropped instead of shifting
+    every following value into the wrong column.
+
+    Inputs
+    -----
+    html (str)
+    signature (tuple of str): headers the table must contain, e.g. ('Year', 'Team')
+    link_ids (bool): whether cells containing a link hold the id in the link (e.g. /team/167/...)
+    rather than the link text
+    (default: False)
+    skip_rows (tuple of str): rows whose first cell is one of these are ignored, e.g. ('Career',)
+    (default: ())
+
+    Outputs
+    -----
+    DataFrame with one column per table header, values as str (None for empty cells).
+    Empty DataFrame if no table matches the signature
+    """
+    root = lxml.html.document_fromstring(html)
+    tables = _stats_table_xpath(tuple(signature))(root)
+    if not tables:
+        return pd.DataFrame()
+    table = tables[0]
+    headers = [th.text_content().strip() for th in _HEADER_CELLS(table)]
+    columns = [[] for _ in headers]
+    for tr in _BODY_ROWS(table):
+        cells = _CELLS(tr)
+        if len(cells) != len(headers) or cells[0].text_content().strip() in skip_rows:
+            continue
+        for column, td in zip(columns, cells):
+            # data is also encoded in data-order attr of td elements
+            value = td.get('data-order')
+            if value is None and link_ids:
+                href = _LINK_HREF(td)
+                if href:
+                    value = href[0].split('/')[2]
+            if value is None:
+                value = td.text_content()
+            value = value.strip()
+            column.append(value if value != '' else None)
+    return pd.DataFrame(dict(zip(headers, columns)), columns=headers)
+
+@functools.lru_cache(maxsize=None)
+def _stats_table_xpath(signature):
+    """
+    Returns: compiled XPath selecting tables whose headers include every name in signature
+    """
+    conditions = ' and '.join(".//th[normalize-space()='"+name+"']" for name in signature)
+    return etree.XPath('//table['+conditions+']')
+
+def _to_number(column):
+    """
+    Returns: column converted by pd.to_numeric. Raises ValueError naming the column if a value is not a number
+    """
+    try:
+        return pd.to_numeric(column)
+    except (ValueError, TypeError) as e:
+        raise ValueError('unexpected value in stat column '+str(column.name)+': '+str(e)) from e
+
 def transform_career_stats(df):
     """
     A helper function to transform raw data loaded from ncaa with get_career_stats
@@ -161,101 +300,49 @@ def transform_career_stats(df):
     
     Outputs
     -----
-    DataFrame indexed by stats_player_seq, season_id
+    DataFrame indexed by stats_player_seq, season_id. Columns listed in STAT_COLUMNS are cast to their
+    dtype, with missing values ('-', '--', ...) set to 0. Pitching tables gain an integer outs column.
+    Raises ValueError if a stat column holds anything else that is not a number (e.g. '1,024').
+    season is the end year of the academic year in Year, e.g. 2013 for '2012-13'
     """
-    
-    def format_names(original):
-        try: 
-            split = original.split(',')
-            split.reverse()
-            res = ' '.join(split).strip().title()
-        except:
-            res = np.nan
-        return res
-    df = df.replace('-', np.nan)
-    df = df.replace('--', np.nan)
-    df = df.replace('---', np.nan)
-    df = df.replace('  -', np.nan)
-    df = df.replace('- -', np.nan)
-    df = df.replace('-  ', np.nan)
-    
-    #TODO: clean this up 
-    if 'Player' in df.columns: 
-        df = df.rename(columns={'Player':'name'})
+
+    # one pass to normalize every dash-only null token ('-', '--', '- -', '  -', ...) in text and stat columns
+    # object columns can mix numbers and null tokens
+    text_cols = [col for col in df.columns if df[col].dtype == object or pd.api.types.is_string_dtype(df[col])]
+    df = df.copy()
+    df[text_cols] = df[text_cols].replace(NULL_PATTERN, np.nan, regex=True)
+    # type every stat column, only the null tokens replaced above become 0
+    stat_cols = [col for col in df.columns if col in STAT_COLUMNS]
+    df[stat_cols] = df[stat_cols].apply(_to_number).astype({col:STAT_COLUMNS[col] for col in stat_cols}).fillna(0.00)
+
+    df = df.rename(columns={'Player':'name'})
     if 'name' in df.columns:
-        df.name = df.name.apply(format_names)
+        # 'Last, First' -> 'First Last'
+        df['name'] = df['name'].str.split(',').str[::-1].str.join(' ').str.strip().str.title()
     if 'stats_player_seq' in df.columns: 
-        df.stats_player_seq = df.stats_player_seq.astype('string')
-        df.stats_player_seq = df.stats_player_seq.str.replace(r'\D+', '')
-    if 'DP' in df.columns: 
-        df['DP'] = df['DP'].astype('float64')
-    if 'RBI2out' in df.columns: 
-        df['RBI2out'] = df['RBI2out'].astype('float64')
-    if 'GP' in df.columns: 
-        df['GP'] = df['GP'].astype('float64')
-    if 'H' in df.columns: 
-        df['H'] = df['H'].astype('float64')
-    if 'TB' in df.columns: 
-        df['TB'] = df['TB'].astype('float64')
-    if '2B' in df.columns: 
-        df['2B'] = df['2B'].astype('float64')
-    if '3B' in df.columns: 
-        df['3B'] = df['3B'].astype('float64')
-    if 'HR' in df.columns: 
-        df['HR'] = df['HR'].astype('float64')
-    if 'RBI' in df.columns: 
-        df['RBI'] = df['RBI'].astype('float64')
-    if 'R' in df.columns: 
-        df['R'] = df['R'].astype('float64')
-    if 'AB' in df.columns: 
-        df['AB'] = df['AB'].astype('float64')
-    if 'BB' in df.columns: 
-        df['BB'] = df['BB'].astype('float64')
-    if 'HBP' in df.columns: 
-        df['HBP'] = df['HBP'].astype('float64')
-    if 'SF' in df.columns: 
-        df['SF'] = df['SF'].astype('float64')
-    if 'K' in df.columns: 
-        df['K'] = df['K'].astype('float64')
-    if 'SH' in df.columns: 
-        df['SH'] = df['SH'].astype('float64')
-    if 'Picked' in df.columns: 
-        df['Picked'] = df['Picked'].astype('float64')
-    if 'SB' in df.columns: 
-        df['SB'] = df['SB'].astype('float64')
-    if 'IBB' in df.columns: 
-        df['IBB'] = df['IBB'].astype('float64')
-    if 'CS' in df.columns: 
-        df['CS'] = df['CS'].astype('float64')
-    if 'OBPct' in df.columns: 
-        df['OBPct'] = df['OBPct'].astype('float64')
-    if 'BA' in df.columns: 
-        df['BA'] = df['BA'].astype('float64')
-    if 'SlgPct' in df.columns: 
-        df['SlgPct'] = df['SlgPct'].astype('float64')
-    if 'Pitches' in df.columns: 
-        df['Pitches'] = df['Pitches'].astype('float64')
+        df['stats_player_seq'] = df['stats_player_seq'].astype('string').str.replace(r'\D+', '', regex=True)
+    if 'IP' in df.columns:
+        # exact innings pitched, see pitching_metrics.ip_to_outs
+        df['outs'] = pitching_metrics.ip_to_outs(df['IP'])
     if 'Year' in df.columns: 
-        df['Year'] = df['Year'].astype('string')
-        df['season'] = df['Year'].str[:4]
-        df.drop(columns=['Year'], inplace=True)
-        df = df.rename(columns={'Team':'team_id'})
-
-
-    
-    df.fillna(value = 0.00, inplace = True)
+        # academic year '2012-13' is the 2013 season (season_id 11320)
+        df['season'] = lookups.season_of_year(df['Year'])
+        df = df.drop(columns=['Year']).rename(columns={'Team':'team_id'})
     return df
 
-def build_roster_db(school_id_lu_path = SCHOOL_ID_LU_PATH, season_id_lu_path = SEASON_ID_LU_PATH, request_timeout = 0.25, save_as = 'players.csv', status_updates = True):
+def build_roster_db(school_id_lu_path = SCHOOL_ID_LU_PATH, season_id_lu_path = SEASON_ID_LU_PATH, max_workers = fetcher.MAX_WORKERS, save_as = 'players.csv', status_updates = True):
     """
-    Calls get_roster to build a table of all (player, season) records
+    Calls get_roster concurrently to build a table of all (player, season) records
+
+    Requests are spread over max_workers threads, but always stay within fetcher's global
+    requests per second budget and per-host concurrency cap, as to not overload NCAA servers
 
     Inputs
     -----
     school_id_lu_path (str): filepath of school_id lookup table
     (default: 'data/ncaa/school_lookup.csv')
-    request_timeout (int): maximum timeout between requests in seconds, as to not overload NCAA servers
-    (default: 0.25)
+    max_workers (int): number of rosters requested at once
+    (default: 8)
     save_as (str): filepath to save DataFrame as csv to. To not save, set to None
     (default: 'players.csv')
     status_updates (bool): whether to give updates on progress of db creation
@@ -266,41 +353,33 @@ def build_roster_db(school_id_lu_path = SCHOOL_ID_LU_PATH, season_id_lu_path = S
     DataFrame indexed by player, season containing stats_player_seq and relevant season_ids
 
     """
-    df = pd.read_csv(school_id_lu_path).iloc[:, 1:]
-    dfs = {}
-    i = 0
-    # Potential Improvement. Vectorize the following loop. Is there a way to send multiple get requests at once?
-    for index, row in df.iterrows():
-        dfs[(row.school_id, row.year)] = get_roster(row.school_id, row.year, headers = {'User-Agent':'Mozilla/5.0'})
-        # tryna be sneaky
-        time.sleep(random.uniform(0, request_timeout))
-        if status_updates:
-            i+=1
-            if i % 50 == 0:
-                print(str(i)+'/8437')
-
-    players = pd.DataFrame() # create an empty df
-    for key in dfs.keys(): # for each (team, season) dataframe in dictionary
-        df_new = dfs[key].copy() # don't write over while iterating through
-        if key[1] == 2019:  # for whatever reason 2019 season records contain an additional field
-            df_new = df_new.drop(columns=['height']) # get rid of said additional field for 2019 records
-        # add columns from data in dictionary
-        df_new['school_id'] = key[0]
-        df_new['season'] = key[1]
-        # append data to result
-        players = pd.concat([players, df_new])
-
-    seasons = pd.read_csv(season_id_lu_path).iloc[:,1:]
-    res = players.merge(seasons, how='left', on='season')
+    df = lookups.school_table(school_id_lu_path)
+    players = RecordBuffer()
+    tasks = [{'school_id':school_id, 'year':year} for school_id, year in zip(df.school_id, df.year)]
+    results = fetcher.fetch_all(get_roster, tasks, max_workers=max_workers, show_progress=status_updates)
+    for task, (roster, error) in zip(tasks, results):
+        if error is not None:
+            print('failure: roster for school_id '+str(task['school_id'])+' in '+str(task['year'])+' ('+str(error)+')')
+            continue
+        if 'height' in roster.columns: # for whatever reason 2019 season records contain an additional field
+            roster = roster.drop(columns=['height'])
+        players.append(roster, school_id=task['school_id'], season=task['year'])
+
+    seasons = lookups.season_table(season_id_lu_path)
+    res = players.to_frame().merge(seasons, how='left', on='season')
     res = res.rename(columns={'id':'season_id'})
     if save_as is not None:
         res.to_csv(save_as, index=False)
     return res
 
 
-def get_conference_records(conference, show_progress = True, print_interval = 5, request_timeout = 0.1):
+def get_conference_records(conference, show_progress = True, print_interval = 5, max_workers = fetcher.MAX_WORKERS, journal_dir = crawl_journal.JOURNAL_DIR, warehouse_path = None, only_failed = False):
     """
     Returns a table of all season records for players in a given conference
+
+    Each player's records are written to a crawl journal as soon as they arrive. If the crawl is
+    interrupted (crash, NCAA 403, ...), calling this again with the same journal_dir skips every player
+    already completed and only requests the ones that failed or never ran.
     
     Inputs
     ----
@@ -309,38 +388,77 @@ def get_conference_records(conference, show_progress = True, print_interval = 5,
     (default: True)
     print_interval (int): If show_progress, the interval between progress updates
     outputs 
-    request_timeout (float): length in seconds between successive calls to database
+    max_workers (int): number of players requested at once, within fetcher's global rate limit
+    (default: 8)
+    journal_dir (str): directory holding the crawl journals, one subdirectory per conference.
+    To crawl without checkpointing, set to None
+    (default: 'data/ncaa/conferences/journals')
+    warehouse_path (str): if given, the result is also written to the Parquet warehouse at this path,
+    e.g. warehouse.WAREHOUSE_PATH
+    (default: None)
+    only_failed (bool): If True, only the players recorded as failed in the journal are requested again,
+    players that never ran are left for a later crawl. Requires journal_dir
+    (default: False)
     
     Outputs
     -----
     DataFrame 
     """
-    res = pd.DataFrame()
+    if only_failed and journal_dir is None:
+        raise ValueError('only_failed requires a journal_dir')
     df = pd.read_pickle(PLAYER_LU_PATH).groupby(by='stats_player_seq').agg('first')
     in_conference =  df.loc[df.conference == conference].reset_index()
-    num_calls = len(in_conference)
-    for index, row in in_conference.iterrows():
-        if index % print_interval == 0: 
-            print('progress: '+str(index)+' of '+str(num_calls)+' complete')
-        try:
-            new = get_career_stats(stats_player_seq = row['stats_player_seq'], season_id= row['season_id'], team_id = row['school_id'])
-            new['season_id'] = row['season_id']
-            new['school_id'] = row['school_id']
-            new['stats_player_seq'] = row['stats_player_seq']
-            new['name'] = row['name']
-        except:
-            print('failure: '+str(row['name'])+' ('+ str(row['stats_player_seq'])+') | season: '+str(row['season'])+' ('+str(row['season_id'])+') | school: '+str(row['school'])+' ('+str(row['school_id'])+')')
-            new = pd.DataFrame()
-            new['season_id'] = row['season_id']
-            new['school_id'] = row['school_id']
-            new['stats_player_seq'] = row['stats_player_seq']
-            new['name'] = row['name']
-        res = pd.concat([res, new])
-        time.sleep(random.uniform(0, request_timeout))
-    return res.reset_index()
-
-
-def get_team_records(school_id, start, end, show_progress = True, print_interval = 10, request_timeout = 0.1):
+    journal = None
+    if journal_dir is not None:
+        journal = crawl_journal.open_journal(conference, journal_dir)
+        done = crawl_journal.completed(journal)
+        failed = crawl_journal.failed(journal)
+        keys = [crawl_journal.make_key(seq, season_id) for seq, season_id in zip(in_conference.stats_player_seq, in_conference.season_id)]
+        if only_failed:
+            pending = [key in failed for key in keys]
+        else:
+            pending = [key not in done for key in keys]
+        in_conference = in_conference.loc[pending].reset_index(drop=True)
+        if show_progress:
+            print('resuming: '+str(sum(key in done for key in keys))+' of '+str(len(keys))+' already complete, '
+                  +str(sum(key in failed for key in keys))+' failed before and are retried')
+    rows = {crawl_journal.make_key(row.stats_player_seq, row.season_id): row for row in in_conference.itertuples()}
+    records = RecordBuffer()
+
+    def record(task, new, error):
+        key = crawl_journal.make_key(task['stats_player_seq'], task['season_id'])
+        row = rows[key]
+        # get_career_stats returns an empty table when the request itself fails
+        if error is None and not new.empty:
+            new['season_id'] = row.season_id
+            new['school_id'] = row.school_id
+            new['stats_player_seq'] = row.stats_player_seq
+            new['name'] = row.name
+            records.append(new)
+            if journal is not None:
+                crawl_journal.record_result(journal, key, new)
+        else:
+            print('failure: '+str(row.name)+' ('+ str(row.stats_player_seq)+') | season: '+str(row.season)+' ('+str(row.season_id)+') | school: '+str(row.school)+' ('+str(row.school_id)+')')
+            if journal is not None:
+                crawl_journal.record_failure(journal, key, error if error is not None else 'no records returned')
+
+    tasks = [{'stats_player_seq':row.stats_player_seq, 'season_id':row.season_id, 'school_id':row.school_id} for row in in_conference.itertuples()]
+    fetcher.fetch_all(get_career_stats, tasks, max_workers=max_workers, callback=record, show_progress=show_progress, print_interval=print_interval)
+    if journal is not None:
+        still_failed = crawl_journal.failed(journal)
+        if show_progress and still_failed:
+            print(str(len(still_failed))+' still failed, retry them with only_failed=True')
+        # include results completed by earlier runs
+        res = crawl_journal.load_results(journal)
+    else:
+        res = records.to_frame()
+    res = res.reset_index()
+    if warehouse_path is not None and not res.empty:
+        warehouse.write_player_seasons(res, warehouse_path)
+    return res
+
+
+def get_team_records(school_id, start, end, show_progress = True, print_interval = 10, max_workers = fetcher.MAX_WORKERS, warehouse_path = None):
     """
     Returns a table of all career season records of players who played for a given team within start, end interval
     
@@ -351,36 +469,35 @@ def get_team_records(school_id, start, end, show_progress = True, print_interval
     (default: True)
     print_interval (int): If show_progress, the interval between progress updates
     outputs 
-    request_timeout (float): length in seconds between successive calls to database
+    max_workers (int): number of players requested at once, within fetcher's global rate limit
+    (default: 8)
+    warehouse_path (str): if given, the result is also written to the Parquet warehouse at this path,
+    e.g. warehouse.WAREHOUSE_PATH
+    (default: None)
     
     Outputs
     -----
     DataFrame 
     """
     # getting roster
-    roster = get_multiyear_roster(school_id, start, end, request_timeout)
+    roster = get_multiyear_roster(school_id, start, end, max_workers)
     df = roster.groupby(by='stats_player_seq').agg('first').reset_index()
     print('roster acquired')
-    num_calls = len(df)
     
-    res = pd.DataFrame()
-    for index, row in df.iterrows():
-        try:
-            new = get_career_stats(stats_player_seq = row['stats_player_seq'], season_id = row['season_id'], school_id = row['school_id'])
-            new['school_id'] = row['school_id']
-            new['stats_player_seq'] = row['stats_player_seq']
-            new['name'] = row['name']
-        except:
+    res = RecordBuffer()
+    tasks = [{'stats_player_seq':row.stats_player_seq, 'season_id':row.season_id, 'school_id':row.school_id} for row in df.itertuples()]
+    results = fetcher.fetch_all(get_career_stats, tasks, max_workers=max_workers, show_progress=show_progress, print_interval=print_interval)
+    for (index, row), (new, error) in zip(df.iterrows(), results):
+        if error is None:
+            res.append(new, school_id=row['school_id'], stats_player_seq=row['stats_player_seq'], name=row['name'])
+        else:
             print('failure: '+str(row['name'])+' ('+ str(row['stats_player_seq'])+') | season: '+str(row['season'])+' ('+str(row['season_id'])+') | school_id: '+' ('+str(row['school_id'])+')')
-            new = pd.DataFrame()
-            new['school_id'] = row['school_id']
-            new['stats_player_seq'] = row['stats_player_seq']
-            new['name'] = row['name']
-        res = pd.concat([res, new])
-        time.sleep(random.uniform(0, request_timeout))
-    return res.reset_index()
+    res = res.to_frame().reset_index()
+    if warehouse_path is not None and not res.empty:
+        warehouse.write_player_seasons(res, warehouse_path)
+    return res
 
-def get_team_records_new(school_id, season, variant='batting', headers={'User-Agent':'Mozilla/5.0'}):
+def get_team_records_new(school_id, season, variant='batting', headers=fetcher.HEADERS):
     """
     Returns: A dataframe of player season totals for a given team in a given season
     data from stats.ncaa.org
@@ -398,36 +515,16 @@ def get_team_records_new(school_id, season, variant='batting', headers={'User-Ag
     payload = {'game_sport_year_ctl_id':str(game_sport_year_ctl_id), 'id':str(game_sport_year_ctl_id), 'year_stat_category_id':str(year_stat_category_id)}
     
     try:
-        r = requests.get(url, params = payload, headers = headers)
-    except:
+        html = fetcher.fetch(url, params = payload, headers = headers, season = season, validate = functools.partial(has_stats_table, signature = TEAM_STATS_SIGNATURE))
+    except requests.RequestException as e:
         print('An error occurred with the GET Request')
-        if r.status_code == 403:
+        if getattr(e.response, 'status_code', None) == 403:
             print('403 Error: NCAA blocked request')
         return pd.DataFrame()
     # parse data
-    soup = BeautifulSoup(r.text, features = 'lxml')
-    table = soup.find_all('table')[2]
-
-    # get table headers
-    headers = []
-    for val in table.find_all('th'):
-        headers.append(val.string.strip())
-    
-    rows = []
-    row = []
-    i = 0
-    for child in table.find('tr', 'text').find_all_next('td'):
-        if i % len(headers) == 0: 
-            row = []
-            rows.append(row)
-        if 'data-order'in child.attrs:
-            row.append(str(child['data-order']).strip())
-        else:
-            row.append(str(child.string))
-        i+=1
-        
-    df = pd.DataFrame(rows)
-    df.columns = headers
+    df = parse_stats_table(html, signature=TEAM_STATS_SIGNATURE)
+    if df.empty:
+        return df
     df['season'] = season
     df = df.loc[(df.Player != 'Opponent Totals') & (df.Player != 'Totals')]
     return transform_career_stats(df)
@@ -437,9 +534,10 @@ def get_season_ids(season):
     Returns: tuple of (season_id, batting_id, pitching_id) for desired season
     
     """
-    lu_df = pd.read_csv('data/ncaa/ncaa_seasonid_lu.csv')
-    season_row = lu_df.loc[lu_df['season'] == season]
-    season_id = season_row.values[0][2]
-    batting_id = season_row.values[0][3]
-    pitching_id = season_row.values[0][4]  
-    return (season_id, batting_id, pitching_id)
+    return lookups.season_ids(season)
+
+def get_season(season_id):
+    """
+    Returns: (int) the season a given season_id (game_sport_year_ctl_id) belongs to
+    """
+    return lookups.season_of(season_id)
@@ -0,0 +1,144 @@
+"""
+A module to aggregate pitch-by-pitch data into pitch mixes by ball-strike count, for pitch tree ("Plinko") reports
+
+Reads TrackMan-style exports (csv or Parquet) with one row per pitch. The pitch mix of every pitcher, season,
+batter handedness and count is computed in a single groupby, once per set of files, and each pitcher's slice
+is cached, so a report renders from precomputed counts instead of hand-typed values.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import functools
+import glob
+import os
+import pandas as pd
+
+# GLOBALS
+PITCH_DATA_PATH = 'data/trackman'
+# TrackMan column -> column used here
+COLUMNS = {'Pitcher':'pitcher', 'Date':'date', 'BatterSide':'batter_side', 'Balls':'balls', 'Strikes':'strikes',
+           'TaggedPitchType':'pitch_type'}
+PITCH_TYPES = ['Fastball', 'Slider', 'Changeup', 'Curveball', 'Unknown']
+# TrackMan pitch types -> PITCH_TYPES, anything else is Unknown
+PITCH_TYPE_MAP = {'Fastball':'Fastball', 'FourSeamFastBall':'Fastball', 'TwoSeamFastBall':'Fastball',
+                  'Sinker':'Fastball', 'Cutter':'Fastball', 'Slider':'Slider', 'Sweeper':'Slider',
+                  'ChangeUp':'Changeup', 'Changeup':'Changeup', 'Splitter':'Changeup', 'Curveball':'Curveball',
+                  'KnuckleCurve':'Curveball', 'Slurve':'Curveball'}
+# every count of the pitch tree, one list per level (number of pitches thrown)
+COUNT_LEVELS = [['0-0'], ['0-1', '1-0'], ['0-2', '1-1', '2-0'], ['1-2', '2-1', '3-0'], ['2-2', '3-1'], ['3-2']]
+COUNTS = [count for level in COUNT_LEVELS for count in level]
+# value of batter_side for pitches to batters of either side
+ALL_BATTERS = 'All'
+
+
+def _pitch_files(path):
+    """
+    Returns: sorted list of the csv and Parquet files at path (a file or a directory)
+    """
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, '*.csv')) + glob.glob(os.path.join(path, '*.parquet')))
+
+def _signature(path):
+    """
+    Returns: tuple of (file, modification time) at path, so cached results are dropped when files change
+    """
+    return tuple((filepath, os.path.getmtime(filepath)) for filepath in _pitch_files(path))
+
+def load_pitches(path=PITCH_DATA_PATH):
+    """
+    Returns: DataFrame of pitcher, season, batter_side, count and pitch_type, one row per pitch
+
+    Only the columns in COLUMNS are read. Pitch types are grouped into PITCH_TYPES and counts are written
+    as 'balls-strikes'. Pitches with an impossible count are dropped
+
+    Parameter path: a csv or Parquet file, or a directory of them
+    Precondition: path is a str
+    """
+    return _read_pitches(_pitch_files(path))
+
+def _read_pitches(files):
+    frames = []
+    for filepath in files:
+        if filepath.endswith('.parquet'):
+            frames.append(pd.read_parquet(filepath, columns=list(COLUMNS)))
+        else:
+            frames.append(pd.read_csv(filepath, usecols=list(COLUMNS)))
+    if not frames:
+        return pd.DataFrame(columns=['pitcher', 'season', 'batter_side', 'count', 'pitch_type'])
+    df = pd.concat(frames, ignore_index=True).rename(columns=COLUMNS)
+    balls = pd.to_numeric(df['balls'], errors='coerce')
+    strikes = pd.to_numeric(df['strikes'], errors='coerce')
+    valid = balls.between(0, 3) & strikes.between(0, 2)
+    df = df[valid]
+    return pd.DataFrame({'pitcher':df['pitcher'].astype(str),
+                         'season':pd.to_datetime(df['date']).dt.year.astype('int16'),
+                         'batter_side':df['batter_side'].fillna('Unknown').astype(str),
+                         'count':pd.Categorical(balls[valid].astype(int).astype(str) + '-' + strikes[valid].astype(int).astype(str), categories=COUNTS),
+                         'pitch_type':pd.Categorical(df['pitch_type'].map(PITCH_TYPE_MAP).fillna('Unknown'), categories=PITCH_TYPES)})
+
+def aggregate(pitches):
+    """
+    Returns: DataFrame of the number of pitches of each type (columns PITCH_TYPES), indexed by
+    pitcher, season, batter_side and count. Pitches to either side are also counted under batter_side ALL_BATTERS
+
+    Parameter pitches: pitches returned by load_pitches
+    Precondition: pitches is a DataFrame
+    """
+    by = ['pitcher', 'season', 'batter_side', 'count']
+    if len(pitches) == 0:
+        return pd.DataFrame(columns=PITCH_TYPES, index=pd.MultiIndex.from_tuples([], names=by), dtype='int64')
+    counts = (pitches.groupby(by + ['pitch_type'], observed=True).size()
+              .unstack('pitch_type', fill_value=0)
+              .reindex(columns=PITCH_TYPES, fill_value=0))
+    both = counts.groupby(level=['pitcher', 'season', 'count'], observed=True).sum()
+    both = pd.concat({ALL_BATTERS:both}, names=['batter_side']).reorder_levels(by)
+    return pd.concat([counts, both]).sort_index()
+
+@functools.lru_cache(maxsize=4)
+def _pitch_mix_table(signature):
+    return aggregate(_read_pitches([filepath for filepath, _ in signature]))
+
+def pitch_mix_table(path=PITCH_DATA_PATH):
+    """
+    Returns: the aggregate of every pitch at path, computed once until its files change.
+    Shared by all callers, do not modify in place
+    """
+    return _pitch_mix_table(_signature(path))
+
+def pitchers(path=PITCH_DATA_PATH):
+    """
+    Returns: sorted list of the pitchers with pitches at path
+    """
+    return sorted(pitch_mix_table(path).index.get_level_values('pitcher').unique())
+
+def seasons(pitcher, path=PITCH_DATA_PATH):
+    """
+    Returns: list of the seasons (int) a pitcher has pitches in at path, most recent first
+    """
+    table = pitch_mix_table(path)
+    rows = table.index.get_level_values('pitcher') == pitcher
+    return sorted({int(season) for season in table.index.get_level_values('season')[rows]}, reverse=True)
+
+@functools.lru_cache(maxsize=256)
+def _pitcher_mix(signature, pitcher, season, batter_side):
+    table = _pitch_mix_table(signature)
+    keep = ((table.index.get_level_values('pitcher') == pitcher)
+            & (table.index.get_level_values('batter_side') == batter_side))
+    if season is not None:
+        keep &= table.index.get_level_values('season') == season
+    rows = table[keep]
+    return rows.groupby(level='count').sum().reindex(COUNTS, fill_value=0).rename_axis('count')
+
+def get_pitch_mix(pitcher, season=None, batter_side=ALL_BATTERS, path=PITCH_DATA_PATH):
+    """
+    Returns: DataFrame of the number of pitches of each type (columns PITCH_TYPES) a pitcher threw in each
+    count (index COUNTS, in tree order). Counts without pitches are 0. Cached per pitcher
+
+    Parameter pitcher: name of the pitcher as written in the data, ex. 'Savino, Nate'
+    Precondition: pitcher is a str
+    Parameter season: season to include, or None for every season
+    Precondition: season is an int or None
+    Parameter batter_side: 'Left', 'Right' or ALL_BATTERS
+    Precondition: batter_side is a str
+    """
+    return _pitcher_mix(_signature(path), pitcher, season, batter_side).copy()
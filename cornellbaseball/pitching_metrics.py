@@ -1,3 +1,10 @@
+"""
+A module to calculate pitching metrics from pitcher-season totals
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import functools
+import os
 import pandas as pd
 import numpy as np
 
@@ -6,7 +13,7 @@ import numpy as np
 STATS_FILEPATH = "data/cornell/cornell_pitching_individual_season_totals_2015_to_2020.xlsx"
 
 # filepath of D1 linear weights
-LW_FILEPATH = "data/ncaa_d1_woba_linear_weights.csv"
+LW_FILEPATH = "data/guts/ncaa_d1_woba_linear_weights.csv"
 # default number of places to round to 
 ROUND_TO = 3
 # FIP Weights
@@ -14,18 +21,117 @@ FIP_HR_WEIGHT = 13
 FIP_BB_WEIGHT = 3
 FIP_K_WEIGHT = 2 
 
+def load_pitching_stats(stats_filepath=STATS_FILEPATH):
+    """
+    Returns: DataFrame of pitcher-season totals read from an Excel, Parquet or CSV file, missing values set to 0
+
+    An integer outs column is added from IP, see ip_to_outs
+    """
+    extension = os.path.splitext(stats_filepath)[1].lower()
+    if extension in ('.xlsx', '.xls'):
+        df = pd.read_excel(stats_filepath)
+    elif extension == '.parquet':
+        df = pd.read_parquet(stats_filepath)
+    else:
+        df = pd.read_csv(stats_filepath)
+    df = df.fillna(0)
+    df["outs"] = ip_to_outs(df["IP"])
+    return df
+
+@functools.lru_cache(maxsize=8)
+def _cached_pitching_stats(stats_filepath):
+    return load_pitching_stats(stats_filepath)
+
+def ip_to_outs(ip):
+    """
+    Returns: numpy int64 array of outs recorded for innings pitched in baseball notation
+
+    IP is recorded in baseball notation, where the digit after the decimal point counts outs: 40.2 = 40 2/3
+    innings = 122 outs. Integer outs divide and sum exactly, where float innings accumulate error.
+    Missing values count as 0 outs. Raises ValueError for impossible values like 5.3
+
+    Parameter ip: innings pitched
+    Precondition: ip is a number, array or Series of numbers
+    """
+    ip = np.nan_to_num(np.asarray(ip, dtype='float64'))
+    whole = np.floor(ip)
+    partial = np.round((ip - whole) * 10)
+    if np.any(partial > 2):
+        raise ValueError("innings pitched must end in .0, .1 or .2")
+    return (whole * 3 + partial).astype('int64')
+
+def outs_to_ip(outs):
+    """
+    Returns: numpy array of innings pitched in baseball notation (122 outs = 40.2)
+
+    Parameter outs: outs recorded
+    Precondition: outs is an int, array or Series of ints
+    """
+    outs = np.asarray(outs, dtype='int64')
+    return (outs // 3) + (outs % 3) / 10
+
+def add_columns(df, lw_filepath=LW_FILEPATH, round_to=ROUND_TO, hr_weight=FIP_HR_WEIGHT, bb_weight=FIP_BB_WEIGHT, k_weight=FIP_K_WEIGHT):
+    """
+    Adds the following columns to a given DataFrame of pitcher-seasons, computed for all rows at once:
+
+    cFIP: FIP constant of the season
+    FIP = ((13 * HR)+(3 * (BB + HBP))-(2 * K))/IP + cFIP
+    ERA = 9 * ER / IP
+    WHIP = (BB + H) / IP
+    R/IP = R / IP
+    K/9 = 9 * SO / IP
+    BB/9 = 9 * BB / IP
+    HR/9 = 9 * HR-A / IP
+
+    Works on Cornell's season totals (load_pitching_stats) as well as
+    ncaa_scrape.get_team_records_new(variant='pitching'). IP is taken from the exact outs column
+    (outs / 3) when present, and parsed from IP otherwise. Pitchers without a recorded out get 0 for every rate.
+    FIP is NaN for seasons without a FIP constant in the linear weights file, and those seasons are reported
+
+    Parameter df: pitcher-season totals with season, IP (or outs), H, R, ER, BB, SO, HB, HR-A columns
+    Precondition: df is a DataFrame
+    """
+    col = lambda name: df[name].to_numpy(dtype='float64') if name in df.columns else np.zeros(len(df))
+    outs = df["outs"].to_numpy(dtype='int64') if "outs" in df.columns else ip_to_outs(df["IP"])
+    ip = outs / 3
+    has_ip = outs > 0
+    safe_ip = np.where(has_ip, ip, 1.0)
+    per_ip = lambda values: np.round(np.where(has_ip, values / safe_ip, 0.0), round_to)
+    weights = pd.read_csv(lw_filepath).drop_duplicates(subset='Season').set_index('Season')
+    cfip = weights['cFIP'].reindex(pd.to_numeric(df['season']).values).to_numpy(dtype='float64')
+    missing = np.isnan(cfip)
+    if missing.any():
+        print("no FIP constant for seasons "+str(sorted({int(season) for season in pd.to_numeric(df['season']).values[missing]}))+", their FIP is NaN")
+    fip = per_ip((hr_weight * col('HR-A')) + (bb_weight * (col('BB') + col('HB'))) - (k_weight * col('SO'))) + cfip
+    df.loc[:, 'cFIP'] = cfip
+    df.loc[:, 'FIP'] = np.round(np.where(has_ip | missing, fip, 0.0), round_to)
+    df.loc[:, 'ERA'] = per_ip(9 * col('ER'))
+    df.loc[:, 'WHIP'] = per_ip(col('BB') + col('H'))
+    df.loc[:, 'R/IP'] = per_ip(col('R'))
+    df.loc[:, 'K/9'] = per_ip(9 * col('SO'))
+    df.loc[:, 'BB/9'] = per_ip(9 * col('BB'))
+    df.loc[:, 'HR/9'] = per_ip(9 * col('HR-A'))
+    return df
+
 def get_season_totals(player_id, season, stats_filepath=STATS_FILEPATH):
     """
     A helper function to filter and prepare data for downstream calcuations
     Returns: pandas.DataFrame object
 
+    The stats file is read once per process and reused for every player and season
     """
-    res = (pd.read_excel(stats_filepath)
-                      .query(f"""player_id=={player_id}""")
-                      .query(f"""season=={season}""")
-                      .fillna(0)
-                     )
-    return res
+    df = _cached_pitching_stats(stats_filepath)
+    return df.loc[(df.player_id == player_id) & (df.season == season)].copy()
+
+def _get_metric(metric, player_id, season, stats_filepath, lw_filepath, round_to):
+    """
+    Returns: a single metric computed by add_columns for a given player in a given season, 0 if not found
+    """
+    data = get_season_totals(player_id, season, stats_filepath)
+    if len(data) == 0:
+        print(f"""no records found for {player_id} in {season}""")
+        return 0
+    return add_columns(data, lw_filepath, round_to)[metric].values[0]
 
 def get_fip(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepath=LW_FILEPATH, round_to=ROUND_TO, hr_weight=FIP_HR_WEIGHT, bb_weight=FIP_BB_WEIGHT, k_weight=FIP_K_WEIGHT):
     """
@@ -40,20 +146,10 @@ def get_fip(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepath=LW_FIL
     Precondition: year is an int
     """
     data = get_season_totals(player_id, season, stats_filepath)
-    strike_outs = data["SO"].values[0]
-    hit_batters = data["HB"].values[0]
-    walks_given = data["BB"].values[0]
-    home_runs_allowed = data["HR-A"].values[0]
-    strike_outs = data["IP"].values[0]
-    season_weights = (pd.read_csv(lw_filepath)
-                      .query(f"""Season=={season}""")
-                     )
-    fip_constant = season_weights["cFIP"].values[0]
-    if strike_outs <= 0: 
-        print(f"""warning: player {player_id} has no recorded strikeouts in {season}, cannot calculate FIP""")
-        res = 0
-    res = (((hr_weight*home_runs_allowed)+(bb_weight*(walks_given+hit_batters))-(k_weight*strike_outs))/strike_outs)+fip_constant
-    return round(res, round_to)
+    if len(data) == 0:
+        print(f"""no records found for {player_id} in {season}""")
+        return 0
+    return add_columns(data, lw_filepath, round_to, hr_weight, bb_weight, k_weight)["FIP"].values[0]
 
 def get_era(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepath=LW_FILEPATH, round_to=ROUND_TO): 
     """
@@ -64,9 +160,7 @@ def get_era(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepath=LW_FIL
     Parameter year: The season to return wRC for 
     Precondition: year is an INT 
     """
-    data = get_season_totals(player_id, season, stats_filepath)
-    res = data["ERA"].values[0]
-    return round(res, round_to)
+    return _get_metric("ERA", player_id, season, stats_filepath, lw_filepath, round_to)
                       
 def get_runs_per_ip(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepath=LW_FILEPATH, round_to=ROUND_TO): 
     """
@@ -74,52 +168,19 @@ def get_runs_per_ip(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepat
     
     runs allowed / innings pitched
     """
-    data = get_season_totals(player_id, season, stats_filepath)
-    runs_allowed = data["R"].values[0]
-    innings_pitched = data["IP"].values[0]
-    if innings_pitched <= 0: 
-        res = 0 
-    else: 
-        res = runs_allowed/innings_pitched
-    return round(res, round_to)
+    return _get_metric("R/IP", player_id, season, stats_filepath, lw_filepath, round_to)
 
 def get_whip(player_id, season, stats_filepath=STATS_FILEPATH, lw_filepath=LW_FILEPATH, round_to=ROUND_TO): 
     """
     Returns: WHIP: walks and hits per innings pitched
     WHIP = (BB+H)/IP
-    runs allowed / innings pitched
     """
-    data = get_season_totals(player_id, season, stats_filepath)
-    walks = data["BB"].values[0]
-    hits = data["H"].values[0]
-    raw_ip = data["IP"].values[0]
-    ip = round(raw_ip,0)+((raw_ip-raw_ip)*3.3)
-    # properly scale IP by multiplying number after decimal point by .33
-    if ip <= 0: 
-        res = 0 
-        print(f"""no records found for {player_id} in {season}""")
-    else:
-        # WHIP = (BB+H)/IP
-        res = round((walks+hits)/ip, round_to)
-    return res
+    return _get_metric("WHIP", player_id, season, stats_filepath, lw_filepath, round_to)
 
-# CALCULATE BATTING METRICS PER PLAYER PER SEASON 
+# CALCULATE PITCHING METRICS PER PLAYER PER SEASON 
 def get_cornell_pitching_stats(stats_filepath=STATS_FILEPATH, lw_filepath=LW_FILEPATH, round_to=ROUND_TO, hr_weight=FIP_HR_WEIGHT, bb_weight=FIP_BB_WEIGHT, k_weight=FIP_K_WEIGHT):
     """
     Returns: DataFrame()
     """
-    data = (pd.read_excel(stats_filepath)
-                   .fillna(0)
-           )
-    # properly scale IP by multiplying number after decimal point by .33
-    data["IP"] = round(data["IP"],0)+((data["IP"]-round(data["IP"],0))*3.3)
-    linear_weights = (pd.read_csv(lw_filepath)
-                                      .rename(columns={"Season":"season"})
-                                      .loc[:,["cFIP", "season"]]
-                     )
-    df = pd.merge(data, linear_weights, on="season",how="left")
-    #  cFIP = lgERA – (((13 * lgHR) + (3 * (lgBB+lgHBP))-(2 * lgK))/ lgIP)
-    #  FIP = ((13 * HR)+(3 * (BB + HBP))-(2 * K))/IP + cFIP
-    df["FIP"] = round(((((hr_weight*df["HR-A"])+(bb_weight*(df["BB"]+df["HB"]))-(k_weight*df["SO"]))/df["IP"]).replace(np.inf, 0)+df["cFIP"]),round_to)
-    df["WHIP"] = round(((df["BB"]+df["H"])/df["IP"]),round_to) 
-    return df.sort_values(by="FIP", ascending=True)
\ No newline at end of file
+    df = add_columns(load_pitching_stats(stats_filepath), lw_filepath, round_to, hr_weight, bb_weight, k_weight)
+    return df.sort_values(by="FIP", ascending=True)
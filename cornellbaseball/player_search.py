@@ -0,0 +1,144 @@
+"""
+A module to search player-seasons by name, school, position and year as the user types
+
+PlayerIndex is built once from the player lookup table. Every word of every searchable field is kept in one
+sorted array, so the rows matching a typed prefix are a binary search away, and the trigrams of every name
+are kept in an inverted index to still find players when a name is misspelled. Only the top matches are
+returned, so a picker never has to hold all D1 player-seasons at once.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import unicodedata
+import numpy as np
+import pandas as pd
+
+# GLOBALS
+SEARCH_FIELDS = ['name', 'school', 'position', 'year']
+SEARCH_LIMIT = 25
+
+
+def _normalize(text):
+    """
+    Returns: (str) text in lowercase ascii, without punctuation, so 'Peña Jr.' is searched as 'pena jr'
+    """
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+    return ''.join(c if c.isalnum() else ' ' for c in text)
+
+def _normalize_series(series):
+    """
+    Returns: Series of series normalized like _normalize, vectorized
+    """
+    return (series.astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower().str.replace(r'[^0-9a-z]+', ' ', regex=True).str.strip())
+
+def _trigrams(text):
+    padded = '  ' + text + ' '
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+
+class PlayerIndex:
+    """
+    A search index over player-seasons, see search
+
+    Each field is factorized, so only its distinct values (a few thousand names, a few hundred schools) are
+    normalized and indexed, and rows are found from the codes of matching values. Missing values match nothing
+
+    Parameter lookup: player-seasons with at least the columns of SEARCH_FIELDS, e.g. data/ncaa/players_lookup.df
+    Precondition: lookup is a DataFrame
+    """
+    def __init__(self, lookup, fields=SEARCH_FIELDS):
+        records = lookup.reset_index(drop=True)
+        # names are sometimes stored as a list of aliases, the first is the one displayed
+        if len(records) > 0 and isinstance(records['name'].iloc[0], (list, tuple)):
+            records = records.assign(name=records['name'].str[0])
+        self.records = records
+        self.codes = [] # per field, the code of each row's value
+        words = []
+        for i, field in enumerate(fields):
+            # missing values are indexed as '', which has no words, so they never match. factorize would give
+            # them code -1, which indexes the last distinct value
+            codes, uniques = pd.factorize(records[field].fillna(''))
+            self.codes.append(codes)
+            normalized = _normalize_series(pd.Series(uniques))
+            if field == 'name':
+                self.name_codes = codes
+                names = normalized
+            split = normalized.str.split().explode().dropna()
+            words.append(pd.DataFrame({'word':split.to_numpy(dtype=str), 'field':i, 'value':split.index.to_numpy()}))
+        # every word of every distinct value, sorted
+        words = pd.concat(words, ignore_index=True)
+        words = words[words['word'] != ''].sort_values(by='word', kind='stable')
+        self.words = words['word'].to_numpy(dtype=str)
+        self.word_fields = words['field'].to_numpy()
+        self.word_values = words['value'].to_numpy()
+        # position of each row in alphabetical order of names
+        name_rank = np.empty(len(names), dtype=np.int64)
+        name_rank[np.argsort(names.to_numpy(dtype=str), kind='stable')] = np.arange(len(names))
+        self.row_rank = name_rank[self.name_codes]
+        # trigram -> distinct names containing it
+        padded = '  ' + names + ' '
+        width = int(padded.str.len().max()) - 2 if len(padded) > 0 else 0
+        grams = pd.DataFrame({'name':np.tile(np.arange(len(padded)), width),
+                              'gram':pd.concat([padded.str[i:i+3] for i in range(width)], ignore_index=True)})
+        grams = grams[grams['gram'].str.len() == 3].drop_duplicates()
+        self.trigrams = {gram:ids.to_numpy() for gram, ids in grams.groupby('gram')['name']}
+        self.n_names = len(names)
+
+    def __len__(self):
+        return len(self.records)
+
+    def _prefix_rows(self, token):
+        """
+        Returns: boolean array, True for the rows with a word starting with token in any field
+        """
+        lo = np.searchsorted(self.words, token, side='left')
+        hi = np.searchsorted(self.words, token + '\uffff', side='left')
+        matched = np.zeros(len(self.records), dtype=bool)
+        for i, codes in enumerate(self.codes):
+            values = self.word_values[lo:hi][self.word_fields[lo:hi] == i]
+            if len(values) > 0:
+                hit = np.zeros(codes.max() + 1, dtype=bool)
+                hit[values] = True
+                matched |= hit[codes]
+        return matched
+
+    def _fuzzy_rows(self, text, limit):
+        """
+        Returns: array of up to limit rows whose names share the most trigrams with text, best first
+        """
+        hits = [self.trigrams[gram] for gram in _trigrams(text) if gram in self.trigrams]
+        if not hits:
+            return np.array([], dtype=int)
+        counts = np.bincount(np.concatenate(hits), minlength=self.n_names)
+        best = np.flatnonzero(counts)
+        best = best[np.argsort(-counts[best], kind='stable')][:limit]
+        score = np.full(self.n_names, len(best))
+        score[best] = np.arange(len(best))
+        rows = np.flatnonzero(score[self.name_codes] < len(best))
+        return rows[np.argsort(score[self.name_codes[rows]], kind='stable')][:limit]
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """
+        Returns: DataFrame of up to limit player-seasons matching text, best matches first
+
+        Every word typed must be the start of a word of the name, school, position or year, in any order,
+        e.g. 'corn smi 2019'. Matches are ordered by name. If no player-season matches every word, the
+        players whose names are closest to text (most shared trigrams) are returned instead
+
+        Parameter text: what the user typed
+        Precondition: text is a str
+        Parameter limit: maximum number of matches
+        Precondition: limit is an int > 0
+        """
+        tokens = _normalize(text).split()
+        if not tokens:
+            return self.records.iloc[:0]
+        matched = self._prefix_rows(tokens[0])
+        for token in tokens[1:]:
+            matched &= self._prefix_rows(token)
+        rows = np.flatnonzero(matched)
+        if len(rows) > 0:
+            ranked = rows[np.argsort(self.row_rank[rows], kind='stable')][:limit]
+        else:
+            ranked = self._fuzzy_rows(' '.join(tokens), limit)
+        return self.records.iloc[ranked]
@@ -0,0 +1,278 @@
+"""
+A module to serve precomputed player career stats and advanced metrics, keyed by stats_player_seq
+
+Career stats and their wOBA, wRAA and wRC are computed once, when the store is built, and written to
+PLAYER_STORE_PATH/bucket=<stats_player_seq % N_BUCKETS>/part-0.parquet, each bucket sorted by stats_player_seq.
+Looking up a player reads one small bucket (cached in memory until it is rewritten) instead of scraping NCAA and
+recomputing metrics on every request. The store is built with build_from_conferences or build_from_warehouse.
+The live scrape only runs in the background, to refresh in-season careers or add a player the store does not have yet.
+
+Requires pyarrow.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import functools
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from cornellbaseball import batting_metrics
+from cornellbaseball import ncaa_scrape
+from cornellbaseball import response_cache
+from cornellbaseball import warehouse
+
+# GLOBALS
+PLAYER_STORE_PATH = 'data/warehouse/player_careers'
+# pickles written from ncaa_scrape.get_conference_records, one per conference
+CONFERENCE_PATTERN = 'data/ncaa/conferences/*.df'
+N_BUCKETS = 64
+PART_FILENAME = 'part-0.parquet'
+# seconds before an in-season career is refreshed from NCAA
+REFRESH_TTL = 24 * 60 * 60
+# number of background refreshes run at once
+REFRESH_WORKERS = 2
+METRIC_COLUMNS = ['PA', '1B', 'wOBA', 'wRAA', 'wRC']
+
+_write_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refreshing = set()
+_building = set() # roots with a pending build
+_refresh_pool = None
+
+
+def _bucket_path(bucket, root):
+    return os.path.join(root, 'bucket='+str(bucket), PART_FILENAME)
+
+def _prepare(records, refreshed_at):
+    """
+    Returns: copy of records with advanced metrics, one row per (stats_player_seq, season), ready to be stored
+    """
+    df = records.copy()
+    df['stats_player_seq'] = pd.to_numeric(df['stats_player_seq']).astype('int64')
+    df['season'] = pd.to_numeric(df['season']).astype('int64')
+    df = df.drop_duplicates(subset=['stats_player_seq', 'season'], keep='last').reset_index(drop=True)
+    df = batting_metrics.add_columns(df)
+    df['refreshed_at'] = refreshed_at
+    # scraped object columns can mix str and numbers, which Parquet cannot store in one column
+    object_cols = [col for col in df.columns if df[col].dtype == object]
+    df[object_cols] = df[object_cols].astype('string')
+    return df
+
+def _write_bucket(df, bucket, root):
+    path = _bucket_path(bucket, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    df.sort_values(by=['stats_player_seq', 'season'], kind='stable').to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def build_store(records, root=PLAYER_STORE_PATH):
+    """
+    Builds the store from player-season batting records, replacing its contents
+
+    Inputs
+    -----
+    records (DataFrame): player-season batting totals with stats_player_seq and season columns, e.g. the output
+    of ncaa_scrape.get_conference_records, warehouse.read_player_seasons or a pickle under data/ncaa/conferences.
+    Other columns (name, school, position, ...) are stored as is
+    root (str): directory of the store
+    (default: 'data/warehouse/player_careers')
+
+    Outputs
+    -----
+    int: the number of player-seasons stored
+    """
+    df = _prepare(records, time.time())
+    with _write_lock:
+        for bucket, part in df.groupby(df['stats_player_seq'] % N_BUCKETS):
+            _write_bucket(part, bucket, root)
+    return len(df)
+
+def is_built(root=PLAYER_STORE_PATH):
+    """
+    Returns: True if the store at root holds at least one bucket
+    """
+    return len(glob.glob(_bucket_path('*', root))) > 0
+
+def load_conference_records(pattern=CONFERENCE_PATTERN):
+    """
+    Returns: DataFrame of the player-season records in the conference pickles, in the format of
+    ncaa_scrape.get_career_stats. Pickles saved before the records were transformed (with Year and Team
+    columns) are transformed with ncaa_scrape.transform_career_stats
+
+    Parameter pattern: glob of the pickles
+    Precondition: pattern is a str
+    """
+    frames = [pd.read_pickle(filepath) for filepath in sorted(glob.glob(pattern))]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True).drop(columns=['index'], errors='ignore')
+    if 'Year' in df.columns:
+        # links were pickled as {'href': '/team/<id>/...'}, keep the id like ncaa_scrape.parse_stats_table
+        df['Team'] = [team['href'].split('/')[2] if isinstance(team, dict) else team for team in df['Team']]
+        df = ncaa_scrape.transform_career_stats(df)
+    return df
+
+def build_from_conferences(pattern=CONFERENCE_PATTERN, root=PLAYER_STORE_PATH):
+    """
+    Builds the store from the conference pickles, see load_conference_records and build_store
+
+    Outputs
+    -----
+    int: the number of player-seasons stored
+    """
+    return build_store(load_conference_records(pattern), root)
+
+def build_from_warehouse(warehouse_path=warehouse.WAREHOUSE_PATH, root=PLAYER_STORE_PATH):
+    """
+    Builds the store from every player-season in the Parquet warehouse, see warehouse.read_player_seasons and build_store
+
+    Outputs
+    -----
+    int: the number of player-seasons stored
+    """
+    records = warehouse.read_player_seasons(root=warehouse_path)
+    # partition columns are read back as categoricals
+    records['season'] = pd.to_numeric(records['season'].astype(str))
+    records['school_id'] = pd.to_numeric(records['school_id'].astype(str))
+    records['conference'] = records['conference'].astype(str)
+    return build_store(records, root)
+
+@functools.lru_cache(maxsize=N_BUCKETS)
+def _read_bucket(path, mtime):
+    """
+    Returns: DataFrame of one bucket indexed by stats_player_seq. Cached until the bucket is rewritten.
+    Shared by all callers, do not modify in place
+    """
+    return pd.read_parquet(path).set_index('stats_player_seq', drop=False).sort_index()
+
+def _load_bucket(bucket, root):
+    path = _bucket_path(bucket, root)
+    if not os.path.exists(path):
+        return None
+    return _read_bucket(path, os.path.getmtime(path))
+
+def get_player(stats_player_seq, root=PLAYER_STORE_PATH):
+    """
+    Returns: DataFrame of a player's career, one row per season with stats, PA, 1B, wOBA, wRAA and wRC.
+    Empty if the player is not in the store
+
+    Parameter stats_player_seq: NCAA id of the player
+    Precondition: stats_player_seq is an int or a str of digits
+    """
+    seq = int(stats_player_seq)
+    bucket = _load_bucket(seq % N_BUCKETS, root)
+    if bucket is None or seq not in bucket.index:
+        return pd.DataFrame()
+    return bucket.loc[[seq]].reset_index(drop=True)
+
+def is_stale(career, ttl=REFRESH_TTL):
+    """
+    Returns: True if a career returned by get_player includes the current season and was refreshed over ttl seconds ago.
+    Careers that ended in a past season never change and are never stale
+    """
+    if len(career) == 0:
+        return True
+    in_season = career['season'].max() >= response_cache.current_season()
+    return bool(in_season and time.time() - career['refreshed_at'].max() > ttl)
+
+def refresh_player(stats_player_seq, school_id, season_id, name=None, root=PLAYER_STORE_PATH):
+    """
+    Returns: DataFrame of a player's career scraped live from NCAA, see get_player. The store is updated with it.
+    Empty (and the store left unchanged) if the scrape fails
+
+    Parameter stats_player_seq: NCAA id of the player
+    Precondition: stats_player_seq is an int or a str of digits
+    Parameter school_id: NCAA id of the player's school
+    Precondition: school_id is an int
+    Parameter season_id: NCAA id of any season the player played for school_id
+    Precondition: season_id is an int
+    Parameter name: name of the player, stored with each season
+    Precondition: name is a str or None
+    """
+    career = ncaa_scrape.get_career_stats(stats_player_seq=stats_player_seq, season_id=season_id, school_id=school_id)
+    if len(career) == 0:
+        return pd.DataFrame()
+    career = career.reset_index(drop=True)
+    career['season'] = pd.to_numeric(career['season']).astype('int64')
+    career['stats_player_seq'] = int(stats_player_seq)
+    career['school_id'] = school_id
+    if name is not None:
+        career['name'] = name
+    seq = int(stats_player_seq)
+    with _write_lock:
+        stored = _load_bucket(seq % N_BUCKETS, root)
+        previous = pd.DataFrame() if stored is None or seq not in stored.index else stored.loc[[seq]]
+        # keep details of the player only known to the store (position, school, ...)
+        details = [col for col in previous.columns if col not in career.columns]
+        if len(previous) > 0 and details:
+            career = career.merge(previous.reset_index(drop=True).loc[:, ['season'] + details], how='left', on='season')
+        career = _prepare(career.drop(columns=METRIC_COLUMNS + ['refreshed_at'], errors='ignore'), time.time())
+        others = [] if stored is None else [stored[stored.index != seq].reset_index(drop=True)]
+        _write_bucket(pd.concat(others + [career], ignore_index=True), seq % N_BUCKETS, root)
+    return career
+
+def _pool():
+    """
+    Returns: the ThreadPoolExecutor running background builds and refreshes, created on first use.
+    Call with _refresh_lock held
+    """
+    global _refresh_pool
+    if _refresh_pool is None:
+        _refresh_pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS)
+    return _refresh_pool
+
+def request_build(pattern=CONFERENCE_PATTERN, root=PLAYER_STORE_PATH):
+    """
+    Schedules build_from_conferences on a background thread, if the store has not been built, and returns immediately.
+    Requests while a build is pending are ignored
+    """
+    with _refresh_lock:
+        if root in _building or is_built(root):
+            return
+        _building.add(root)
+        pool = _pool()
+    def run():
+        try:
+            build_from_conferences(pattern, root)
+        except Exception as e:
+            print('failed to build player store at '+root+': '+str(e))
+        finally:
+            with _refresh_lock:
+                _building.discard(root)
+    pool.submit(run)
+
+def request_refresh(stats_player_seq, school_id, season_id, name=None, root=PLAYER_STORE_PATH):
+    """
+    Schedules refresh_player on a background thread and returns immediately.
+    Requests for a player whose refresh is already pending are ignored
+    """
+    seq = int(stats_player_seq)
+    with _refresh_lock:
+        if seq in _refreshing:
+            return
+        _refreshing.add(seq)
+        pool = _pool()
+    def run():
+        try:
+            refresh_player(seq, school_id, season_id, name=name, root=root)
+        except Exception as e:
+            print('failed to refresh player '+str(seq)+': '+str(e))
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(seq)
+    pool.submit(run)
+
+def get_or_refresh(stats_player_seq, school_id, season_id, name=None, root=PLAYER_STORE_PATH):
+    """
+    Returns: DataFrame of a player's career, see get_player
+
+    Served from the store and never scraped on the caller's thread. A player missing from the store, or a stale
+    in-season career, is refreshed in the background (see request_refresh): the missing player is returned
+    empty until the refresh completes, the stale career is returned as stored
+    """
+    career = get_player(stats_player_seq, root)
+    if len(career) == 0 or is_stale(career):
+        request_refresh(stats_player_seq, school_id, season_id, name=name, root=root)
+    return career
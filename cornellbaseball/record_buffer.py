@@ -0,0 +1,46 @@
+"""
+A module to accumulate scraped tables without repeatedly copying them
+
+Growing a DataFrame with pd.concat([res, new]) inside a loop copies everything gathered so far on every
+iteration, which is quadratic in the number of rows. RecordBuffer instead keeps the appended tables in a list
+and concatenates them once, at the end.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import pandas as pd
+
+
+class RecordBuffer:
+    """
+    An append-only buffer of tables, materialized into one DataFrame by to_frame()
+
+    Columns missing from some appended tables are filled with the missing value of their dtype
+    (NaN, NaT or <NA>) for those rows
+    """
+    def __init__(self):
+        self.frames = []
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, df, **constants):
+        """
+        Appends the rows of df to the buffer
+
+        Parameter df: table to append
+        Precondition: df is a DataFrame
+        Parameter constants: additional columns holding the same value for every row of df, e.g. season=2019
+        """
+        if len(df) == 0:
+            return
+        self.frames.append(df.assign(**constants) if constants else df)
+        self.length += len(df)
+
+    def to_frame(self):
+        """
+        Returns: DataFrame of every appended row, in the order they were appended
+        """
+        if not self.frames:
+            return pd.DataFrame()
+        return pd.concat(self.frames, ignore_index=True, sort=False)
@@ -0,0 +1,91 @@
+"""
+A module to cache responses from stats.ncaa.org on disk
+
+Responses are content-addressed by a hash of their URL and query parameters and stored gzip-compressed.
+Pages belonging to closed seasons never change, so they are kept forever. Pages that can still change
+(the current season) are re-downloaded once they are older than CURRENT_SEASON_TTL.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from urllib.parse import urlencode
+
+# GLOBALS
+# directory cached responses are written to
+CACHE_DIR = 'data/cache/http'
+# seconds before a page from the current season is revalidated
+CURRENT_SEASON_TTL = 6 * 60 * 60
+
+
+def current_season():
+    """
+    Returns: (int) the season still in progress, whose pages may change
+    """
+    return date.today().year
+
+def cache_key(url, params=None):
+    """
+    Returns: (str) sha256 hex digest identifying a GET request by its URL and (sorted) query parameters
+    """
+    query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return hashlib.sha256((url + '?' + query).encode('utf-8')).hexdigest()
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], key + '.html.gz')
+
+def is_fresh(path, season=None, ttl=CURRENT_SEASON_TTL):
+    """
+    Returns: (bool) whether the cached response at path can be served without going to the network
+
+    Parameter season: the last season whose results can appear on the page. None is treated as the current season
+    Precondition: season is an int or None
+    """
+    if not os.path.exists(path):
+        return False
+    if season is not None and season < current_season():
+        return True
+    return time.time() - os.path.getmtime(path) < ttl
+
+def load(url, params=None, season=None, ttl=CURRENT_SEASON_TTL, cache_dir=CACHE_DIR):
+    """
+    Returns: (str) the cached body of a GET request, or None if it is missing or stale
+    """
+    path = _cache_path(cache_key(url, params), cache_dir)
+    if not is_fresh(path, season, ttl):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, EOFError):
+        # partially written or corrupt entry, treat as a miss
+        return None
+
+def store(url, text, params=None, cache_dir=CACHE_DIR):
+    """
+    Writes the body of a GET request to the cache
+
+    The entry is written to a temporary file first and moved into place, so concurrent
+    readers never see a partially written response
+    """
+    path = _cache_path(cache_key(url, params), cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            f.write(text.encode('utf-8'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def clear(cache_dir=CACHE_DIR):
+    """
+    Deletes every cached response
+    """
+    shutil.rmtree(cache_dir, ignore_errors=True)
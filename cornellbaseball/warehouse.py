@@ -0,0 +1,98 @@
+"""
+A module to store scraped NCAA player-seasons as a partitioned Parquet dataset
+
+Records are written to WAREHOUSE_PATH/season=<season>/conference=<conference>/school_id=<school_id>/,
+one file per partition, so a reader can load only the partitions (predicate pushdown) and columns
+(projection) it needs instead of deserializing a pickle of everything.
+
+Requires pyarrow.
+
+created by Nathan Blumenfeld for Cornell Baseball
+"""
+import os
+import pandas as pd
+from cornellbaseball import lookups
+
+# GLOBALS
+WAREHOUSE_PATH = 'data/warehouse/player_seasons'
+PARTITION_COLS = ['season', 'conference', 'school_id']
+PART_FILENAME = 'part-0.parquet'
+
+
+def _add_conference(df):
+    """
+    Returns: copy of df with a conference column looked up from (school_id, season). season must be the
+    season played (2013 for '2012-13'), the lookup's year column
+    """
+    schools = lookups.school_table().drop_duplicates(subset=['school_id', 'year']).loc[:, ['school_id', 'year', 'conference']]
+    return df.merge(schools.rename(columns={'year':'season'}), how='left', on=['school_id', 'season'])
+
+def write_player_seasons(df, root=WAREHOUSE_PATH):
+    """
+    Writes a table of player-seasons to the warehouse, replacing any partitions it overlaps
+
+    Inputs
+    -----
+    df (DataFrame): player-season records with school_id and season columns, e.g. the output of
+    ncaa_scrape.get_conference_records. Records with a Year column instead of season (e.g. the raw pickles
+    under data/ncaa/conferences) get the season Year ends in, see lookups.season_of_year; pass those through
+    ncaa_scrape.transform_career_stats first to also type their stat columns. If there is no conference
+    column it is looked up from school_id and season. Missing conferences are stored as 'Unknown'
+    root (str): directory of the dataset
+    (default: 'data/warehouse/player_seasons')
+
+    Outputs
+    -----
+    list of (season, conference, school_id) partitions written
+    """
+    df = df.copy()
+    if 'season' not in df.columns and 'Year' in df.columns:
+        df['season'] = lookups.season_of_year(df['Year'])
+    df['season'] = pd.to_numeric(df['season']).astype('int64')
+    df['school_id'] = pd.to_numeric(df['school_id']).astype('int64')
+    if 'conference' not in df.columns:
+        df = _add_conference(df)
+    df['conference'] = df['conference'].fillna('Unknown')
+    if 'index' in df.columns:
+        df = df.drop(columns=['index'])
+    # scraped object columns can mix str and numbers, which Parquet cannot store in one column
+    object_cols = [col for col in df.columns if df[col].dtype == object and col not in PARTITION_COLS]
+    df[object_cols] = df[object_cols].astype('string')
+    written = []
+    for key, part in df.groupby(PARTITION_COLS, sort=False):
+        path = os.path.join(root, *(col+'='+str(value) for col, value in zip(PARTITION_COLS, key)))
+        os.makedirs(path, exist_ok=True)
+        part.drop(columns=PARTITION_COLS).to_parquet(os.path.join(path, PART_FILENAME), index=False)
+        written.append(key)
+    return written
+
+def read_player_seasons(columns=None, season=None, conference=None, school_id=None, filters=None, root=WAREHOUSE_PATH):
+    """
+    Returns: DataFrame of player-seasons from the warehouse
+
+    Only partitions matching season, conference and school_id are opened, and only the requested columns are read.
+
+    Inputs
+    -----
+    columns (list of str): columns to load. Partition columns are only included if requested
+    (default: None, all columns)
+    season (int or list of int): season(s) to load
+    (default: None, all seasons)
+    conference (str or list of str): conference(s) to load
+    (default: None, all conferences)
+    school_id (int or list of int): school(s) to load
+    (default: None, all schools)
+    filters (list of tuple): additional pyarrow filters, e.g. [('AB', '>', 50)]
+    (default: None)
+    root (str): directory of the dataset
+    (default: 'data/warehouse/player_seasons')
+    """
+    predicates = list(filters or [])
+    for col, value in (('season', season), ('conference', conference), ('school_id', school_id)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            predicates.append((col, 'in', list(value)))
+        else:
+            predicates.append((col, '==', value))
+    return pd.read_parquet(root, columns=columns, filters=predicates or None)
@@ -4,11 +4,14 @@ A module to calculate actual and expected winning percentages from boysworld.com
 created by Nathan Blumenfeld for Cornell Baseball
 """
 
+import numpy as np
 import pandas as pd
-from cornellbaseball import boydsworld_scraper
+from cornellbaseball import game_store
 
 # GLOBAL VARIABLES
 ROUND_TO = 3
+PYTHAGOREAN_EXPONENT = 2
+PYTHAGENPAT_EXPONENT = 0.287
 
 def calculate_actual_win_pct(team_1=None, games=None, start=None, end=None, round_to=ROUND_TO):
     """
@@ -27,7 +30,7 @@ def calculate_actual_win_pct(team_1=None, games=None, start=None, end=None, roun
     """
     if games is None: 
             assert start is not None, "if not supplying a DataFrame of games, must specify start"
-            games = boydsworld_scraper.get_games(team_1, start, end=end)     
+            games = game_store.get_games(team_1, start, end=end)     
     if len(games) > 0: 
         actual_win_pct = len(games[games.run_difference > 0]) / len(games)
     else: 
@@ -53,7 +56,7 @@ def calculate_pythagenpat_win_pct(team_1=None, games=None, start=None, end=None,
     """
     if games is None: 
         assert start is not None, "if not supplying a DataFrame of games, must specify start"
-        games = boydsworld_scraper.get_games(team_1, start, end=end)
+        games = game_store.get_games(team_1, start, end=end)
     runs_scored_total = games.runs_scored.sum()
     runs_allowed_total = games.runs_allowed.sum()
     games_played_count = len(games) 
@@ -63,4 +66,61 @@ def calculate_pythagenpat_win_pct(team_1=None, games=None, start=None, end=None,
         runs_per_game = runs_scored_total / games_played_count
         x = runs_per_game ** 0.287
         expected_win_pct = (runs_scored_total**x)/((runs_scored_total**x)+(runs_allowed_total**x))
-    return round(expected_win_pct, round_to)
\ No newline at end of file
+    return round(expected_win_pct, round_to)
+
+def calculate_win_pct_table(games, by=("team", "season"), round_to=ROUND_TO):
+    """
+    Returns: DataFrame of the actual, Pythagorean and PythagenPat winning percentages of each group of games,
+    computed for every group in one pass
+
+    Output columns are by, games, wins, losses, ties, runs_scored, runs_allowed, actual_win_pct,
+    pythagorean_win_pct, pythagenpat_win_pct and deviation (pythagenpat_win_pct - actual_win_pct).
+    Values match calculate_actual_win_pct and calculate_pythagenpat_win_pct applied to each group
+
+    Parameter games: games of one or more teams, e.g. returned by game_store.load_games.
+    A season column is derived from date if missing
+    Precondition: games is a DataFrame with by columns, run_difference, runs_scored and runs_allowed
+    Parameter by: columns to group on
+    Precondition: by is a tuple of str
+    """
+    by = list(by)
+    if "season" in by and "season" not in games.columns:
+        games = games.assign(season=games["date"].dt.year)
+    runs_scored = games["runs_scored"].astype("int64")
+    runs_allowed = games["runs_allowed"].astype("int64")
+    totals = (pd.DataFrame({"wins":games["run_difference"] > 0, "losses":games["run_difference"] < 0,
+                            "runs_scored":runs_scored, "runs_allowed":runs_allowed})
+              .groupby([games[col] for col in by])
+              .agg(games=("wins", "size"), wins=("wins", "sum"), losses=("losses", "sum"),
+                   runs_scored=("runs_scored", "sum"), runs_allowed=("runs_allowed", "sum")))
+    totals["ties"] = totals["games"] - totals["wins"] - totals["losses"]
+    rs = totals["runs_scored"].to_numpy(dtype=float)
+    ra = totals["runs_allowed"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (rs / totals["games"].to_numpy()) ** PYTHAGENPAT_EXPONENT
+        pythagorean = rs**PYTHAGOREAN_EXPONENT / (rs**PYTHAGOREAN_EXPONENT + ra**PYTHAGOREAN_EXPONENT)
+        pythagenpat = rs**x / (rs**x + ra**x)
+    totals["actual_win_pct"] = totals["wins"] / totals["games"]
+    totals["pythagorean_win_pct"] = np.nan_to_num(pythagorean)
+    totals["pythagenpat_win_pct"] = np.nan_to_num(pythagenpat)
+    totals["deviation"] = totals["pythagenpat_win_pct"] - totals["actual_win_pct"]
+    cols = ["actual_win_pct", "pythagorean_win_pct", "pythagenpat_win_pct", "deviation"]
+    totals[cols] = totals[cols].round(round_to)
+    return totals.loc[:, ["games", "wins", "losses", "ties", "runs_scored", "runs_allowed"] + cols].reset_index()
+
+def get_win_pct_table(teams, start, end=None, by=("team", "season"), round_to=ROUND_TO):
+    """
+    Returns: DataFrame of actual and expected winning percentages of given teams over given seasons,
+    see calculate_win_pct_table. Games are read from game_store, so archived seasons need no network requests
+
+    Parameter teams: teams to include, ex. ["Cornell", "Yale"]
+    Precondition: teams is a list of str
+    Parameter start: the start year of games
+    Precondition: start is an int
+    Parameter end: the end year of games. To select only games from start, leave None
+    Precondition: end is an int or None
+    Parameter by: columns to group on, e.g. ("team",) for one row per team over all seasons
+    Precondition: by is a tuple of str
+    """
+    games = game_store.load_games([(team, start, end) for team in teams])
+    return calculate_win_pct_table(games, by=by, round_to=round_to)
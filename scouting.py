@@ -3,33 +3,41 @@ import pandas as pd
 import numpy as np
 from st_aggrid import AgGrid
 from cornellbaseball import ncaa_scrape
-from cornellbaseball import boydsworld_scraper as bd
+from cornellbaseball import game_store
 from cornellbaseball import batting_metrics
 from cornellbaseball import win_pct
 import plotly.express as px
 import plotly.graph_objects as go
 import altair as alt
 import time
+import app_cache
 
 
-@st.cache
+@app_cache.data(max_entries=app_cache.DATA_MAX_ENTRIES * 16)
+def load_season(team, season):
+    """
+    Returns: games of a team in one season, in order, with a season column.
+    Cached per (team, season), so changing the range of seasons only loads the seasons added to it
+    """
+    data = game_store.get_games(team, season, end = None)
+    return data.assign(season = season).reset_index(drop=True)
+
 def load_bd_data(team, start, end):
     """
+    Returns: games of a team from start to end with cumulative runs scored (cum_rs), allowed (cum_ra) and
+    differential (cum_rd), and the game_number of each game within its season
     """
-    res = pd.DataFrame()
-    for season in range(start, end+1):
-        data = bd.get_games(team, season, end = None)
-        data.loc[:, "season"] = data.date.dt.year
-        data.loc[:, "cum_rs"] = data.runs_scored.cumsum()
-        data.loc[:, "cum_ra"] = data.runs_allowed.cumsum()
-        data.loc[:, "cum_rd"] = data.run_difference.cumsum()
-        data.loc[:, "game_number"] = data.index
-        res = pd.concat([res, data], ignore_index=True)
-    return res.sort_values(by='game_number')
+    res = pd.concat([load_season(team, season) for season in range(start, end+1)], ignore_index=True)
+    by_season = res.groupby('season', sort=False)
+    res["cum_rs"] = by_season["runs_scored"].cumsum()
+    res["cum_ra"] = by_season["runs_allowed"].cumsum()
+    res["cum_rd"] = by_season["run_difference"].cumsum()
+    res["game_number"] = by_season.cumcount()
+    return res.sort_values(by='game_number', kind='stable')
 
 st.set_page_config(page_title="Scouting Reports", layout="centered")
 
-@st.cache 
+@app_cache.resource
 def load_team_names():
     """
     Returns: pandas Series of accepted team names for boydsworld
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from cornellbaseball.player_search import PlayerIndex
+
+
+def make_index():
+    lookup = pd.DataFrame({'name':['Doe, Jane', 'Catcher, Bo', 'Smith, Al'],
+                           'school':['Yale', np.nan, 'Cornell'],
+                           'position':[np.nan, 'P', 'C'],
+                           'year':['2019', '2021', '2020']})
+    return PlayerIndex(lookup)
+
+def test_missing_field_never_matches():
+    # 'C' is the last distinct position, a missing position must not be read as it
+    names = make_index().search('c')['name'].tolist()
+    assert 'Doe, Jane' not in names
+    assert names == ['Catcher, Bo', 'Smith, Al']
+
+def test_other_fields_of_row_with_missing_value_match():
+    index = make_index()
+    assert index.search('jane 2019')['name'].tolist() == ['Doe, Jane']
+    assert index.search('catcher 2021')['name'].tolist() == ['Catcher, Bo']